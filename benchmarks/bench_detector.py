@@ -0,0 +1,389 @@
+"""
+Offline benchmark for the loot detector.
+
+Synthesizes screenshots by pasting sprites from the template catalog
+(sprites/ + shiny_sprites/) into a drawn loot bag at the slot geometry
+find_items uses, degrades them (sensor noise, other resolutions, JPEG) and
+runs detect_loot on the encoded bytes, the same way the bot does.
+
+Reports per-stage latency percentiles, throughput per core, peak memory and
+top-1 accuracy, and writes everything to a JSON file so runs on different
+commits can be compared:
+
+    python -m benchmarks.bench_detector
+    BENCH_COMPARE=benchmarks/results/detector-<old>.json python -m benchmarks.bench_detector
+
+Settings come from the environment (BENCH_*), like the bot's own config.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Unix only; on Windows the max RSS figure is left out
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import cv2
+import numpy as np
+
+from utils.find_items import DETECT_STAGES, clear_caches, detect_loot
+from utils.gui_locator import (
+    BORDER, GAP_GRAY, GRID_COLS, GRID_ROWS, INNER_GRAY, OUTER_GRAY,
+    REFERENCE_BOX, REFERENCE_GRID, REFERENCE_SIZE, SLOT_GAP, SLOT_SIZE,
+)
+from utils.template_bank import TEMPLATES_FOLDER, get_template_bank
+from utils.template_catalog import load_catalog
+
+# --- Configuration ---
+BENCH_CASES = int(os.getenv("BENCH_CASES", "200"))
+BENCH_SEED = int(os.getenv("BENCH_SEED", "1234"))
+# Extra run through a process pool to measure scaling (0 = skip)
+BENCH_WORKERS = int(os.getenv("BENCH_WORKERS", "0"))
+# Keep the GUI/slot caches between cases (measures the warm path instead)
+BENCH_WARM = os.getenv("BENCH_WARM", "0") == "1"
+# Cases re-run under tracemalloc for the peak-memory figure
+BENCH_MEMORY_CASES = int(os.getenv("BENCH_MEMORY_CASES", "10"))
+BENCH_COMPARE = os.getenv("BENCH_COMPARE", "")
+RESULTS_FOLDER = "./benchmarks/results/"
+BENCH_OUTPUT = os.getenv("BENCH_OUTPUT", "")
+
+THRESHOLD = 0.85
+
+# Output resolutions; the frame is drawn at 1080p and rescaled, except for
+# ultrawide sizes where the UI keeps its size and the world view widens.
+RESOLUTIONS = [(1920, 1080), (1280, 720), (1366, 768), (2560, 1440), (3840, 2160), (2560, 1080)]
+JPEG_SHARE = 0.5              # fraction of cases re-encoded as JPEG
+JPEG_QUALITY = (60, 95)
+NOISE_SIGMA = (0.0, 3.0)      # gaussian sensor/compression noise, in gray levels
+
+# --- Loot bag geometry (see utils.gui_locator / utils.find_items) ---
+SLOT_FILL_GRAY = 71           # approximate empty-slot background
+SIDEBAR_X = 1560              # left edge of the right-hand UI panel at 1080p
+SLOT_INNER = 70               # area find_items crops per slot (then shrinks to 40x40)
+PERCENTILES = (50, 90, 99)
+
+
+# ----------------------------------------------------------------------
+# Synthetic screenshots
+# ----------------------------------------------------------------------
+def _world(rng, width, height):
+    """Blobby, low-frequency game-world background."""
+    small = rng.integers(0, 140, size=(max(2, height // 60), max(2, width // 60), 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def _slot_boxes():
+    """Top-left corner of each slot's SLOT_INNER area, as find_items crops it."""
+    x0, y0, x1, y1 = REFERENCE_BOX
+    cell_w = (x1 - x0) // GRID_COLS
+    cell_h = (y1 - y0) // GRID_ROWS
+    pad_x, pad_y = (cell_w - SLOT_INNER) // 2, (cell_h - SLOT_INNER) // 2
+    return [
+        (x0 + col * (cell_w + 1) + pad_x, y0 + row * cell_h + pad_y)
+        for row in range(GRID_ROWS)
+        for col in range(GRID_COLS)
+    ]
+
+SLOT_BOXES = _slot_boxes()
+
+
+def _draw_loot_bag(frame):
+    """Right-hand UI panel with an empty 2x4 loot grid in the stock grays."""
+    frame[:, SIDEBAR_X:] = GAP_GRAY
+    gx, gy = REFERENCE_GRID
+    for row in range(GRID_ROWS):
+        for col in range(GRID_COLS):
+            x = gx + col * (SLOT_SIZE + SLOT_GAP)
+            y = gy + row * (SLOT_SIZE + SLOT_GAP)
+            frame[y:y + SLOT_SIZE, x:x + SLOT_SIZE] = OUTER_GRAY
+            frame[y + BORDER:y + SLOT_SIZE - BORDER, x + BORDER:x + SLOT_SIZE - BORDER] = INNER_GRAY
+            inner = 2 * BORDER
+            frame[y + inner:y + SLOT_SIZE - inner, x + inner:x + SLOT_SIZE - inner] = SLOT_FILL_GRAY
+
+
+def _paste_sprite(frame, sprite, x, y):
+    """Alpha-composite a BGRA sprite scaled up to the slot's match area."""
+    sprite = cv2.resize(sprite, (SLOT_INNER, SLOT_INNER), interpolation=cv2.INTER_NEAREST)
+    region = frame[y:y + SLOT_INNER, x:x + SLOT_INNER].astype(np.float32)
+    alpha = sprite[:, :, 3:4].astype(np.float32) / 255.0
+    blended = sprite[:, :, :3].astype(np.float32) * alpha + region * (1.0 - alpha)
+    frame[y:y + SLOT_INNER, x:x + SLOT_INNER] = np.round(blended).astype(np.uint8)
+
+
+def _resize_frame(frame, rng, resolution):
+    ref_w, ref_h = REFERENCE_SIZE
+    width, height = resolution
+    if height == ref_h and width > ref_w:
+        # Ultrawide: same UI scale, more world on the left
+        return np.concatenate([_world(rng, width - ref_w, height), frame], axis=1)
+    if (width, height) == (ref_w, ref_h):
+        return frame
+    shrink = width < ref_w
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
+
+
+def synthesize_case(rng, catalog, load_sprite):
+    """
+    One synthetic screenshot: returns (encoded bytes, {slot: key}, settings).
+    Slots are numbered 1-8 like find_items' detections.
+    """
+    ref_w, ref_h = REFERENCE_SIZE
+    frame = _world(rng, ref_w, ref_h)
+    _draw_loot_bag(frame)
+
+    filled = sorted(rng.choice(len(SLOT_BOXES), size=int(rng.integers(0, len(SLOT_BOXES) + 1)), replace=False))
+    truth = {}
+    for i in filled:
+        entry = catalog[int(rng.integers(len(catalog)))]
+        _paste_sprite(frame, load_sprite(entry["path"]), *SLOT_BOXES[i])
+        truth[int(i) + 1] = entry["key"]
+
+    resolution = RESOLUTIONS[int(rng.integers(len(RESOLUTIONS)))]
+    frame = _resize_frame(frame, rng, resolution)
+
+    sigma = float(rng.uniform(*NOISE_SIGMA))
+    if sigma > 0:
+        noise = rng.normal(0.0, sigma, frame.shape).astype(np.float32)
+        frame = np.clip(frame.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+    quality = None
+    if rng.random() < JPEG_SHARE:
+        quality = int(rng.integers(JPEG_QUALITY[0], JPEG_QUALITY[1] + 1))
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    else:
+        ok, encoded = cv2.imencode(".png", frame)
+    if not ok:
+        raise RuntimeError("Could not encode a synthetic screenshot")
+
+    settings = {"resolution": f"{frame.shape[1]}x{frame.shape[0]}", "noise_sigma": round(sigma, 2), "jpeg_quality": quality}
+    return encoded.tobytes(), truth, settings
+
+
+class SpriteCache:
+    """Decoded BGRA sprites plus a pixel digest, so look-alike sprites can be told apart from real misses."""
+
+    def __init__(self):
+        self._sprites = {}
+
+    def __call__(self, path):
+        if path not in self._sprites:
+            sprite = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if sprite is None:
+                raise RuntimeError(f"Could not read sprite {path}")
+            if sprite.ndim == 2:
+                sprite = cv2.cvtColor(sprite, cv2.COLOR_GRAY2BGRA)
+            elif sprite.shape[2] == 3:
+                sprite = cv2.cvtColor(sprite, cv2.COLOR_BGR2BGRA)
+            self._sprites[path] = sprite
+        return self._sprites[path]
+
+    def digest(self, path):
+        sprite = cv2.resize(self(path), (40, 40), interpolation=cv2.INTER_NEAREST)
+        sprite[sprite[:, :, 3] == 0] = 0  # colour under transparent pixels does not matter
+        return sprite.tobytes()
+
+
+# ----------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------
+def _timed_detect(data):
+    """Worker entry point: detect one encoded screenshot from a cold (or warm) cache."""
+    if not BENCH_WARM:
+        clear_caches()
+    result = detect_loot(data, TEMPLATES_FOLDER, THRESHOLD, name="bench.png")
+    return {slot["slot"]: slot["key"] for slot in result["items"]}, result["timings"]
+
+
+def _percentiles(values):
+    if not values:
+        return {}
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(np.mean(values)), 3)
+    summary["max"] = round(float(np.max(values)), 3)
+    return summary
+
+
+def score_case(truth, detected, key_paths, sprites):
+    """Per-slot outcome counts for one screenshot."""
+    counts = {"slots": len(truth), "correct": 0, "equivalent": 0, "wrong": 0, "missed": 0, "false_positives": 0}
+    for slot, key in truth.items():
+        found = detected.get(slot)
+        if found is None:
+            counts["missed"] += 1
+        elif found == key:
+            counts["correct"] += 1
+        elif sprites.digest(key_paths[found]) == sprites.digest(key_paths[key]):
+            # Different item with a pixel-identical sprite; no detector can separate these
+            counts["equivalent"] += 1
+        else:
+            counts["wrong"] += 1
+    counts["false_positives"] = sum(1 for slot in detected if slot not in truth)
+    return counts
+
+
+def _pool_throughput(cases, workers):
+    """Screenshots per second through a process pool of `workers`."""
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_template_bank, initargs=(TEMPLATES_FOLDER,)) as pool:
+        # Let every worker load its bank before timing
+        list(pool.map(_timed_detect, [cases[0][0]] * workers))
+        started = time.perf_counter()
+        list(pool.map(_timed_detect, [data for data, _, _ in cases], chunksize=4))
+        elapsed = time.perf_counter() - started
+    return len(cases) / elapsed if elapsed else 0.0
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark():
+    rng = np.random.default_rng(BENCH_SEED)
+
+    started = time.perf_counter()
+    bank = get_template_bank(TEMPLATES_FOLDER)
+    bank_load_ms = (time.perf_counter() - started) * 1000
+    _, catalog = load_catalog()
+    key_paths = {entry["key"]: entry["path"] for entry in catalog}
+    sprites = SpriteCache()
+    print(f"📦 {len(bank.names)} templates loaded in {bank_load_ms:.0f} ms")
+
+    cases = [synthesize_case(rng, catalog, sprites) for _ in range(BENCH_CASES)]
+    print(f"🖼️ Synthesized {len(cases)} screenshots (seed {BENCH_SEED})")
+
+    # --- Latency + accuracy, one core ---
+    stage_times = {stage: [] for stage in DETECT_STAGES}
+    totals = {"slots": 0, "correct": 0, "equivalent": 0, "wrong": 0, "missed": 0, "false_positives": 0}
+    by_resolution = {}
+    failures = []
+    for n, (data, truth, settings) in enumerate(cases):
+        detected, timings = _timed_detect(data)
+        for stage, ms in timings.items():
+            stage_times[stage].append(ms)
+        counts = score_case(truth, detected, key_paths, sprites)
+        for field, value in counts.items():
+            totals[field] += value
+        res = by_resolution.setdefault(settings["resolution"], {"cases": 0, "slots": 0, "correct": 0, "equivalent": 0})
+        res["cases"] += 1
+        res["slots"] += counts["slots"]
+        res["correct"] += counts["correct"]
+        res["equivalent"] += counts["equivalent"]
+        if counts["wrong"] or counts["missed"] or counts["false_positives"]:
+            failures.append({"case": n, **settings, "truth": truth, "detected": detected})
+
+    mean_total = np.mean(stage_times["total"]) if stage_times["total"] else 0.0
+    single_core = 1000.0 / mean_total if mean_total else 0.0
+
+    # --- Peak memory (separate pass; tracemalloc slows allocation down) ---
+    peak_traced = 0
+    tracemalloc.start()
+    for data, _, _ in cases[:BENCH_MEMORY_CASES]:
+        tracemalloc.reset_peak()
+        _timed_detect(data)
+        peak_traced = max(peak_traced, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None  # KiB on Linux
+
+    pool = None
+    if BENCH_WORKERS > 0:
+        throughput = _pool_throughput(cases, BENCH_WORKERS)
+        pool = {"workers": BENCH_WORKERS, "per_second": round(throughput, 2),
+                "per_core_per_second": round(throughput / BENCH_WORKERS, 2)}
+
+    slots = totals["slots"]
+    return {
+        "benchmark": "detector",
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "numpy": np.__version__, "opencv": cv2.__version__},
+        "settings": {"cases": len(cases), "seed": BENCH_SEED, "warm_cache": BENCH_WARM, "threshold": THRESHOLD,
+                     "templates": len(bank.names)},
+        "bank_load_ms": round(bank_load_ms, 1),
+        "latency_ms": {stage: _percentiles(times) for stage, times in stage_times.items() if times},
+        "throughput": {"single_core_per_second": round(single_core, 2), "pool": pool},
+        "memory": {"peak_traced_mb_per_detection": round(peak_traced / 2**20, 2),
+                   "max_rss_mb": round(max_rss_kb / 1024, 1) if max_rss_kb is not None else None},
+        "accuracy": {
+            **totals,
+            "top1": round(totals["correct"] / slots, 4) if slots else None,
+            # Counting look-alike sprites as hits
+            "top1_equivalent": round((totals["correct"] + totals["equivalent"]) / slots, 4) if slots else None,
+            "by_resolution": {
+                res: {
+                    **counts,
+                    "top1": round(counts["correct"] / counts["slots"], 4) if counts["slots"] else None,
+                    "top1_equivalent": (round((counts["correct"] + counts["equivalent"]) / counts["slots"], 4)
+                                        if counts["slots"] else None),
+                }
+                for res, counts in sorted(by_resolution.items())
+            },
+        },
+        "failures": failures[:50],
+    }
+
+
+# ----------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------
+def print_report(report, baseline=None):
+    print(f"\n⏱️ Latency (ms) — {report['settings']['cases']} cases, commit {report['commit']}")
+    for stage, summary in report["latency_ms"].items():
+        line = f"  {stage:7s} " + "  ".join(f"{k}={v:8.2f}" for k, v in summary.items())
+        old = (baseline or {}).get("latency_ms", {}).get(stage, {}).get("p50")
+        if old:
+            line += f"   p50 {100 * (summary['p50'] - old) / old:+.1f}% vs {baseline['commit']}"
+        print(line)
+
+    throughput = report["throughput"]
+    print(f"🚀 Throughput: {throughput['single_core_per_second']:.1f} screenshots/s on one core")
+    if throughput["pool"]:
+        pool = throughput["pool"]
+        print(f"   {pool['per_second']:.1f}/s with {pool['workers']} workers ({pool['per_core_per_second']:.1f}/s per core)")
+
+    memory = report["memory"]
+    line = f"🧠 Memory: {memory['peak_traced_mb_per_detection']} MB traced peak per detection"
+    if memory["max_rss_mb"] is not None:
+        line += f", {memory['max_rss_mb']} MB max RSS"
+    print(line)
+
+    accuracy = report["accuracy"]
+    if accuracy["top1"] is not None:
+        line = (f"🎯 Top-1: {accuracy['top1']:.2%} ({accuracy['top1_equivalent']:.2%} counting look-alike sprites) — "
+                f"{accuracy['wrong']} wrong, {accuracy['missed']} missed, {accuracy['false_positives']} false positives")
+        old = (baseline or {}).get("accuracy", {}).get("top1")
+        if old is not None:
+            line += f" [{100 * (accuracy['top1'] - old):+.2f} pts]"
+        print(line)
+        for res, counts in accuracy["by_resolution"].items():
+            if counts["top1"] is not None:
+                print(f"   {res:>9s}: {counts['top1']:.2%} exact, {counts['top1_equivalent']:.2%} with look-alikes "
+                      f"of {counts['slots']} slots")
+
+
+def save_report(report):
+    path = BENCH_OUTPUT or os.path.join(RESULTS_FOLDER, f"detector-{report['commit']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    baseline = None
+    if BENCH_COMPARE:
+        with open(BENCH_COMPARE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    report = run_benchmark()
+    print_report(report, baseline)
+    save_report(report)
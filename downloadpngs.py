@@ -1,7 +1,6 @@
 import os
 import re
 import time
-import requests
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 from selenium import webdriver
@@ -9,9 +8,13 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 
+from utils.sprite_downloader import download_sprites
+
 # === CONFIGURATION ===
 url = "https://www.realmeye.com/wiki/rings"
 output_dir = "downloaded_pngs"
+# Shares the git-ignored sprite manifest (entries are keyed by save path)
+manifest_file = "./sprite_manifest.json"
 
 # === SETUP SELENIUM (Headless Chrome) ===
 options = Options()
@@ -32,6 +35,9 @@ driver.get(url)
 time.sleep(3)  # wait for JS to load
 
 html = driver.page_source
+# Reuse the browser's cookies and UA for the image requests
+cookies = {c["name"]: c["value"] for c in driver.get_cookies()}
+user_agent = driver.execute_script("return navigator.userAgent;")
 driver.quit()
 
 # === PARSE HTML ===
@@ -47,20 +53,13 @@ for a_tag in soup.find_all("a", title=True):
         title = a_tag["title"]
         safe_title = re.sub(r'[\\/*?:"<>|]', "", title).strip()
         filename = f"{safe_title}.png"
-        download_tasks.append((img_url, filename))
+        download_tasks.append((img_url, os.path.join(output_dir, filename), filename))
 
 print(f"Found {len(download_tasks)} PNGs.")
 
-# === DOWNLOAD PNGs ===
-for i, (img_url, filename) in enumerate(download_tasks, start=1):
-    filepath = os.path.join(output_dir, filename)
-    try:
-        r = requests.get(img_url, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
-        with open(filepath, "wb") as f:
-            f.write(r.content)
-        print(f"[{i}] ✅ {filename}")
-    except Exception as e:
-        print(f"[{i}] ❌ Failed to download {img_url}: {e}")
+# === DOWNLOAD PNGs (concurrently, over one pooled session) ===
+stats = download_sprites(download_tasks, manifest_path=manifest_file,
+                         cookies=cookies, user_agent=user_agent, referer=url)
 
-print(f"\n✅ Done! {len(download_tasks)} images downloaded to '{output_dir}/'.")
+print(f"\n✅ Done! {stats['downloaded']} images downloaded, {stats['unchanged']} unchanged, "
+      f"{stats['failed']} failed, in '{output_dir}/'.")
@@ -2,14 +2,32 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
-import aiosqlite
 import os
-import json
+import asyncio
+import math
+import time
 
-from utils.find_items import find_items_in_image
 from utils.calc_points import calculate_loot_points
-from utils.player_records import load_player_records, save_player_records, ensure_player_exists
+from utils.player_records import (
+    load_player_records, guild_records, records_version,
+    start_flusher, stop_flusher, dirty_guild_count,
+)
+from utils.points_table import reload_points_table
+from utils.leaderboard import (
+    LEADERBOARD_PAGE_SIZE, get_leaderboard,
+    update_player as update_leaderboard, remove_player as remove_from_leaderboard,
+)
+from utils.pagination import LIST_PAGE_SIZE, PaginatorView, list_pages, page_count
+from utils.ppe_channels import (
+    load_ppe_channels, adopt_legacy_channels, is_ppe_channel, get_ppe_channels,
+    add_ppe_channel, remove_ppe_channel,
+)
+from utils.repost_index import find_repost, is_same_screenshot, remember_screenshots, repost_lock
+from utils.record_store import open_store, close_store, migrate_json_records
 from utils.role_checks import require_ppe_roles
+from utils.debounce import Debouncer
+from utils.detection_executor import DetectionExecutor, DetectionQueueFull
+from utils import metrics
 
 SERVER1_ID = 879497062117412924 # Last Oasis
 SERVER2_ID = 1435436110829326459 # Test Server
@@ -19,8 +37,28 @@ guilds = [discord.Object(id=SERVER1_ID), discord.Object(id=SERVER2_ID)]
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 
+# Screenshot detection runs in worker processes, off the event loop
+detector = DetectionExecutor(
+    workers=int(os.getenv("DETECTION_WORKERS", "2")),
+    queue_size=int(os.getenv("DETECTION_QUEUE_SIZE", "8")),
+)
+
 class PPEBot(commands.Bot):
     async def setup_hook(self):
+        # Start detection workers (each loads the sprite templates once)
+        await detector.start()
+        # Load the loot points table once; it hot-reloads when the CSV changes
+        reload_points_table()
+        # Open the records database and import any legacy JSON record files
+        await open_store()
+        await migrate_json_records()
+        # Records are served from memory and written behind in batches
+        start_flusher()
+        # PPE channel registry lives in memory; the file is only written on change
+        load_ppe_channels()
+        # Event-loop lag probe, plus the Prometheus endpoint if METRICS_PORT is set
+        await metrics.start_metrics()
+
         # Print to confirm commands are loaded BEFORE syncing
         print("Loaded commands:", [cmd.name for cmd in self.tree.get_commands()])
 
@@ -34,6 +72,15 @@ class PPEBot(commands.Bot):
 
         print("Guild commands synced!")
 
+    async def close(self):
+        # Score screenshots still waiting in a debounce window before the workers go away
+        await loot_batches.flush()
+        detector.shutdown()
+        await super().close()
+        await stop_flusher()
+        await close_store()
+        await metrics.stop_metrics()
+
 intents = discord.Intents.default()
 intents.message_content = True
 
@@ -101,15 +148,8 @@ async def setup_roles(interaction: discord.Interaction):
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user}")
-    async with aiosqlite.connect("data.db") as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS points (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                points INTEGER DEFAULT 0
-            )
-        """)
-        await db.commit()
+    # Old global channel lists can only be split per guild once channels are cached
+    adopt_legacy_channels(bot.get_channel)
     # # clear global commands
     # await bot.tree.sync()           # Make sure we fetch the existing global cmds
     # bot.tree.clear_commands(guild=None)       # Clear them locally
@@ -132,29 +172,32 @@ async def ping(interaction: discord.Interaction):
 async def newppe(interaction: discord.Interaction):
     # ctx = interaction
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
     key = interaction.user.display_name.lower()
-    # Check membership first
-    if key not in records or not records[key].get("is_member", False):
-        return await interaction.response.send_message("❌ You’re not part of the PPE contest. Ask a mod to add you with `!addplayer @you`.")
+    # Validate before changing anything; reply once the guild lock is released
+    async with guild_records(guild_id) as records:
+        player_data = records.get(key)
+        ppe_count = len(player_data.get("ppes", [])) if player_data else 0
 
-    player_data = records[key]
+        # Check membership first
+        if not player_data or not player_data.get("is_member", False):
+            reply = "❌ You’re not part of the PPE contest. Ask a mod to add you with `!addplayer @you`."
 
-    # --- PPE limit check ---
-    ppe_count = len(player_data.get("ppes", []))
-    if ppe_count >= 10:
-        return await interaction.response.send_message("⚠️ You’ve reached the limit of `10 PPEs`. Delete or reuse an existing one before making a new one.")
+        # --- PPE limit check ---
+        elif ppe_count >= 10:
+            reply = "⚠️ You’ve reached the limit of `10 PPEs`. Delete or reuse an existing one before making a new one."
 
-    # --- Create new PPE ---
-    next_id = max([ppe["id"] for ppe in player_data["ppes"]], default=0) + 1
-    new_ppe = {"id": next_id, "name": f"PPE #{next_id}", "points": 0, "items": []}
+        # --- Create new PPE ---
+        else:
+            next_id = max([ppe["id"] for ppe in player_data["ppes"]], default=0) + 1
+            new_ppe = {"id": next_id, "name": f"PPE #{next_id}", "points": 0, "items": []}
 
-    player_data["ppes"].append(new_ppe)
-    player_data["active_ppe"] = next_id
-    await save_player_records(guild_id=guild_id, records=records)
+            player_data["ppes"].append(new_ppe)
+            player_data["active_ppe"] = next_id
+            update_leaderboard(guild_id, key, player_data)
+            reply = (f"✅ Created `PPE #{next_id}` and set it as your active PPE.\n"
+                     f"You now have {ppe_count + 1}/10 PPEs.")
 
-    await interaction.response.send_message(f"✅ Created `PPE #{next_id}` and set it as your active PPE.\n"
-                    f"You now have {ppe_count + 1}/10 PPEs.")
+    await interaction.response.send_message(reply)
 
 
 @bot.tree.command(name="setactiveppe", description="Set which PPE is active for point tracking.", guilds=guilds)
@@ -162,19 +205,175 @@ async def newppe(interaction: discord.Interaction):
 @require_ppe_roles(player_required=True)
 async def setactiveppe(interaction: discord.Interaction, ppe_id: int):
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
-    key = ensure_player_exists(records, interaction.user.display_name)
-    player_data = records[key]
+    key = interaction.user.display_name.lower()
+    async with guild_records(guild_id) as records:
+        # Look the player up without creating a stub entry for them
+        player_data = records.get(key)
+        ppe_ids = [ppe["id"] for ppe in player_data["ppes"]] if player_data else []
 
-    ppe_ids = [ppe["id"] for ppe in player_data["ppes"]]
-    if ppe_id not in ppe_ids:
-        return await interaction.response.send_message(f"❌ You don’t have a PPE #{ppe_id}. Use !newppe to create one.")
+        if ppe_id not in ppe_ids:
+            reply = f"❌ You don’t have a PPE #{ppe_id}. Use !newppe to create one."
+        else:
+            player_data["active_ppe"] = ppe_id
+            reply = f"✅ Set `PPE #{ppe_id}` as your active PPE."
 
-    player_data["active_ppe"] = ppe_id
-    await save_player_records(guild_id=guild_id, records=records)
-    await interaction.response.send_message(f"✅ Set `PPE #{ppe_id}` as your active PPE.")
+    await interaction.response.send_message(reply)
 
         
+##########################
+#### LOOT SCREENSHOTS ####
+##########################
+
+DOWNLOAD_DIR = "./downloads"
+# Screenshots are decoded from memory; set SAVE_SCREENSHOTS=1 to also keep copies on disk
+SAVE_SCREENSHOTS = os.getenv("SAVE_SCREENSHOTS", "0") == "1"
+MESSAGE_LIMIT = 2000
+
+async def send_lines(channel, lines):
+    """Send lines as few messages as possible without passing Discord's limit."""
+    chunk = ""
+    for line in lines:
+        if chunk and len(chunk) + 1 + len(line) > MESSAGE_LIMIT:
+            await channel.send(chunk)
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line
+    if chunk:
+        await channel.send(chunk)
+
+def save_screenshot(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+async def process_loot_batch(key, posts):
+    """
+    Score every screenshot a player posted within the debounce window:
+    download them all at once, detect them in parallel on the worker
+    pool, then award points in one records transaction and one reply.
+    """
+    guild_id, _ = key
+    message = posts[-1][0]
+    channel = message.channel
+    player_name = str(message.author.display_name)
+
+    # --- Download all attachments concurrently (kept in memory) ---
+    attachments = [a for _, screenshots in posts for a in screenshots]
+    sources = [post for post, screenshots in posts for _ in screenshots]
+    with metrics.timed("download"):
+        downloads = await asyncio.gather(*(a.read() for a in attachments), return_exceptions=True)
+    metrics.inc("screenshots_total", len(attachments))
+
+    # A screenshot that fails to download or detect is reported; the rest are still scored
+    failed, jobs = [], []
+    for attachment, source, data in zip(attachments, sources, downloads):
+        if isinstance(data, Exception):
+            print(f"⚠️ Could not download {attachment.filename}: {data!r}")
+            failed.append(attachment.filename)
+        elif isinstance(data, BaseException):
+            raise data
+        else:
+            jobs.append((attachment, source, data))
+    names = [f"{a.id}_{a.filename}" for a, _, _ in jobs]
+
+    if SAVE_SCREENSHOTS:
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        await asyncio.gather(*(
+            asyncio.to_thread(save_screenshot, os.path.join(DOWNLOAD_DIR, name), data)
+            for name, (_, _, data) in zip(names, jobs)
+        ))
+
+    # --- Fan detection out across the worker pool ---
+    announced = False
+    async def announce_queue(position):
+        nonlocal announced
+        if not announced:
+            announced = True
+            await channel.send(f"⏳ Loot check queued, position {position}.")
+
+    results = await asyncio.gather(
+        *(detector.detect(data, on_queued=announce_queue, name=name) for name, (_, _, data) in zip(names, jobs)),
+        return_exceptions=True,
+    )
+
+    # --- Drop re-posts, then score and remember the rest. The guild's repost
+    # lock spans all three, so two batches cross-posting the same screenshot
+    # cannot both pass the check. ---
+    found_items, busy, repeats, scored = [], 0, [], []
+    loot_results, total, error = [], 0, None
+    async with repost_lock(guild_id):
+        repost_started = time.perf_counter()
+        for result, (attachment, source, _) in zip(results, jobs):
+            if isinstance(result, DetectionQueueFull):
+                busy += 1
+                continue
+            if isinstance(result, Exception):
+                print(f"⚠️ Loot detection failed for {attachment.filename}: {result!r}")
+                failed.append(attachment.filename)
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            if not result["items"]:
+                continue
+            if result["gui_hash"]:
+                earlier = await find_repost(guild_id, result)
+                if earlier is None and any(is_same_screenshot(r, result) for r, _ in scored):
+                    earlier = {"player": player_name.lower()}
+                if earlier is not None:
+                    repeats.append(earlier)
+                    continue
+            scored.append((result, source))
+            found_items.extend(result["items"])
+        metrics.observe_stage("repost_check", (time.perf_counter() - repost_started) * 1000)
+        metrics.inc("reposts_total", len(repeats))
+        metrics.inc("items_detected_total", len(found_items))
+        metrics.inc("screenshots_failed_total", len(failed))
+
+        # --- Score everything in one transaction ---
+        if found_items:
+            try:
+                with metrics.timed("scoring"):
+                    loot_results, total = await calculate_loot_points(guild_id, player_name, found_items)
+            except ValueError as e:
+                error = e
+            else:
+                with metrics.timed("repost_record"):
+                    await remember_screenshots(guild_id, [
+                        (result, player_name.lower(), source.id)
+                        for result, source in scored if result["gui_hash"]
+                    ])
+
+    if failed:
+        listed = ", ".join(f"`{name}`" for name in failed)
+        await channel.send(f"⚠️ {len(failed)} of {len(attachments)} screenshot(s) could not be checked: {listed}. Please re-post them.")
+    if busy:
+        await channel.send(f"🚦 Loot detection is busy right now; {busy} of {len(attachments)} screenshot(s) were skipped. Please re-post them in a minute.")
+    if repeats:
+        first_by = ", ".join(sorted({f"`{r['player'].title()}`" for r in repeats}))
+        await channel.send(f"♻️ {len(repeats)} screenshot(s) were already scored (first posted by {first_by}); no points awarded for them.")
+    if error is not None:
+        return await channel.send(f"❌ {error}")
+    if not found_items:
+        return
+
+    msg_lines = [f"`{player_name}'s Loot Summary:`"]
+    if len(scored) > 1:
+        msg_lines[0] = f"`{player_name}'s Loot Summary ({len(scored)} screenshots):`"
+    for loot in loot_results:
+        dup_tag = " (Duplicate ⚠️)" if loot["duplicate"] else ""
+        msg_lines.append(f"- {loot['item']}: +{loot['points']} points{dup_tag}")
+    msg_lines.append(f"`Total Points:` {total:.1f}")
+    with metrics.timed("reply"):
+        await send_lines(channel, msg_lines)
+
+loot_batches = Debouncer(float(os.getenv("LOOT_DEBOUNCE_SECONDS", "3")), process_loot_batch)
+
+# Queue depths, sampled whenever metrics are read
+metrics.gauge("detection_jobs_running", lambda: detector.pending - detector.queued)
+metrics.gauge("detection_jobs_queued", lambda: detector.queued)
+metrics.gauge("slot_cache_hit_rate", lambda: detector.slot_cache_hit_rate)
+metrics.gauge("loot_batches_waiting", lambda: loot_batches.waiting)
+metrics.gauge("records_dirty_guilds", dirty_guild_count)
+
+
 @bot.event
 async def on_message(message: discord.Message):
     guild_id = message.guild.id
@@ -182,8 +381,7 @@ async def on_message(message: discord.Message):
         return
     
     # --- Only allow in registered PPE channels ---
-    ppe_channels = load_ppe_channels()
-    if message.channel.id not in ppe_channels:
+    if not is_ppe_channel(guild_id, message.channel.id):
         # Still allow normal commands to run elsewhere
         return await bot.process_commands(message)
 
@@ -191,29 +389,14 @@ async def on_message(message: discord.Message):
     has_ppe_player = discord.utils.get(message.author.roles, name="PPE Player")
     has_ppe_admin = discord.utils.get(message.author.roles, name="PPE Admin")
 
-    if has_ppe_player and message.channel.id in ppe_channels:
-        # --- Process attachments for loot detection ---
-    
-        for attachment in message.attachments:
-            if attachment.filename.lower().endswith((".png", ".jpg", ".jpeg")):
-                # --- Prepare download directory ---
-                download_dir = "./downloads"
-                os.makedirs(download_dir, exist_ok=True)
-                file_path = f"./downloads/{attachment.filename}"
-                await attachment.save(file_path)
-
-                found_items = find_items_in_image(file_path)
-                if found_items:
-                    player_name = str(message.author.display_name)
-                    loot_results, total = await calculate_loot_points(guild_id, player_name, found_items)
-
-                    msg_lines = [f"`{player_name}'s Loot Summary:`"]
-                    for loot in loot_results:
-                        dup_tag = " (Duplicate ⚠️)" if loot["duplicate"] else ""
-                        msg_lines.append(f"- {loot['item']}: +{loot['points']} points{dup_tag}")
-                    msg_lines.append(f"`Total Points:` {total:.1f}")
-
-                    await message.channel.send("\n".join(msg_lines))
+    if has_ppe_player:
+        # --- Queue screenshots; posts a few seconds apart are scored together ---
+        screenshots = [
+            a for a in message.attachments
+            if a.filename.lower().endswith((".png", ".jpg", ".jpeg"))
+        ]
+        if screenshots:
+            loot_batches.add((guild_id, message.author.id), (message, screenshots))
 
     await bot.process_commands(message)
 
@@ -223,27 +406,26 @@ async def on_message(message: discord.Message):
 @require_ppe_roles(admin_required=True)
 async def addpointsfor(interaction: discord.Interaction, member: discord.Member, amount: float):
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
     key = member.display_name.lower()
-
-    if key not in records or not records[key].get("is_member", False):
-        return await interaction.response.send_message(f"❌ {member.display_name} is not part of the PPE contest.")
-
-    player_data = records[key]
-    active_id = player_data.get("active_ppe")
-    if not active_id:
-        return await interaction.response.send_message(f"❌ {member.display_name} does not have an active PPE.")
-
-    active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None)
-    if not active_ppe:
-        return await interaction.response.send_message(f"❌ Could not find {member.display_name}'s active PPE record.")
-    import math
     amount = math.floor(amount * 2) / 2
-    active_ppe["points"] += amount
-    await save_player_records(guild_id=guild_id, records=records)
+    async with guild_records(guild_id) as records:
+        player_data = records.get(key)
+        active_id = player_data.get("active_ppe") if player_data else None
+        active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None) if active_id else None
+
+        if not player_data or not player_data.get("is_member", False):
+            reply = f"❌ {member.display_name} is not part of the PPE contest."
+        elif not active_id:
+            reply = f"❌ {member.display_name} does not have an active PPE."
+        elif not active_ppe:
+            reply = f"❌ Could not find {member.display_name}'s active PPE record."
+        else:
+            active_ppe["points"] += amount
+            update_leaderboard(guild_id, key, player_data)
+            reply = (f"✅ Added `{amount:.1f}` points to `{member.display_name}`’s active PPE (PPE #{active_id}).\n"
+                     f"`New total:` {active_ppe['points']:.1f} points.")
 
-    await interaction.response.send_message(f"✅ Added `{amount:.1f}` points to `{member.display_name}`’s active PPE (PPE #{active_id}).\n"
-                    f"`New total:` {active_ppe['points']:.1f} points.")
+    await interaction.response.send_message(reply)
 
 
 @bot.tree.command(name="addpoints", description="Add points to your active PPE.", guilds=guilds)
@@ -251,28 +433,74 @@ async def addpointsfor(interaction: discord.Interaction, member: discord.Member,
 @require_ppe_roles(player_required=True)
 async def addpoints(interaction: discord.Interaction, amount: float):
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
     key = interaction.user.display_name.lower()
-
-    # Must be a contest member
-    if key not in records or not records[key].get("is_member", False):
-        return await interaction.response.send_message("❌ You’re not part of the PPE contest. Ask a mod to add you with `!addplayer @you`.")
-    player_data = records[key]
-    active_id = player_data.get("active_ppe")
-    if not active_id:
-        return await interaction.response.send_message("❌ You don’t have an active PPE. Use `!newppe` to create one first.")
-    # Find the active PPE
-    active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None)
-    if not active_ppe:
-        return await interaction.response.send_message("❌ Could not find your active PPE record. Try creating a new one with `!newppe`.")
     # Add points (rounded down to nearest 0.5)
-    import math
     amount = math.floor(amount * 2) / 2
-    active_ppe["points"] += amount
-    await save_player_records(guild_id=guild_id, records=records)
+    async with guild_records(guild_id) as records:
+        player_data = records.get(key)
+        active_id = player_data.get("active_ppe") if player_data else None
+        # Find the active PPE
+        active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None) if active_id else None
+
+        # Must be a contest member
+        if not player_data or not player_data.get("is_member", False):
+            reply = "❌ You’re not part of the PPE contest. Ask a mod to add you with `!addplayer @you`."
+        elif not active_id:
+            reply = "❌ You don’t have an active PPE. Use `!newppe` to create one first."
+        elif not active_ppe:
+            reply = "❌ Could not find your active PPE record. Try creating a new one with `!newppe`."
+        else:
+            active_ppe["points"] += amount
+            update_leaderboard(guild_id, key, player_data)
+            reply = (f"✅ Added `{amount:.1f}` points to your active PPE (PPE #{active_id}).\n"
+                     f"`New total:` {active_ppe['points']:.1f} points.")
+
+    await interaction.response.send_message(reply)
+
+
+@bot.tree.command(name="reloadpoints", description="Reload the loot points table from disk.", guilds=guilds)
+@require_ppe_roles(admin_required=True)
+async def reloadpoints(interaction: discord.Interaction):
+    count = reload_points_table(force=True)
+    await interaction.response.send_message(f"🔁 Points table reloaded: `{count}` items.")
+
 
-    await interaction.response.send_message(f"✅ Added `{amount:.1f}` points to your active PPE (PPE #{active_id}).\n"
-                    f"`New total:` {active_ppe['points']:.1f} points.")
+@bot.tree.command(name="botstats", description="Show loot pipeline timings and queue depths.", guilds=guilds)
+@require_ppe_roles(admin_required=True)
+async def botstats(interaction: discord.Interaction):
+    # --- Per-stage latency (ms) since startup ---
+    rows = [f"{'stage':<13}{'count':>7}{'p50':>8}{'p95':>8}{'max':>9}"]
+    for stage in metrics.LOOT_STAGES:
+        hist = metrics.stage_histogram(stage)
+        if hist is None:
+            continue
+        rows.append(f"{stage:<13}{hist.count:>7}{hist.quantile(0.5):>8.1f}{hist.quantile(0.95):>8.1f}{hist.max:>9.1f}")
+    stages_text = "```\n" + "\n".join(rows) + "\n```" if len(rows) > 1 else "No screenshots processed yet."
+
+    gauges = metrics.gauge_values()
+    lag = metrics.histogram("event_loop_lag_ms")
+    lag_text = f"p95 `{lag.quantile(0.95):.1f} ms`, max `{lag.max:.1f} ms`" if lag else "not measured yet"
+    hours, rest = divmod(int(metrics.uptime()), 3600)
+
+    embed = discord.Embed(title="📈 Bot Stats", color=discord.Color.blurple())
+    embed.add_field(name="Loot pipeline (ms)", value=stages_text, inline=False)
+    embed.add_field(name="Queues", value=(
+        f"Detection: `{gauges.get('detection_jobs_running', 0):.0f}` running, "
+        f"`{gauges.get('detection_jobs_queued', 0):.0f}` queued\n"
+        f"Debounce batches waiting: `{gauges.get('loot_batches_waiting', 0):.0f}`\n"
+        f"Guilds with unsaved records: `{gauges.get('records_dirty_guilds', 0):.0f}`"
+    ), inline=False)
+    embed.add_field(name="Event loop lag", value=lag_text, inline=True)
+    embed.add_field(name="Slot cache hit rate", value=f"`{gauges.get('slot_cache_hit_rate', 0):.0%}`", inline=True)
+    embed.add_field(name="Totals", value=(
+        f"Screenshots: `{metrics.counter_value('screenshots_total')}`, "
+        f"re-posts: `{metrics.counter_value('reposts_total')}`, "
+        f"rejected (busy): `{metrics.counter_value('detections_rejected_total')}`, "
+        f"failed: `{metrics.counter_value('screenshots_failed_total')}`, "
+        f"items: `{metrics.counter_value('items_detected_total')}`"
+    ), inline=False)
+    embed.set_footer(text=f"Uptime {hours}h {rest // 60}m")
+    await interaction.response.send_message(embed=embed)
 
 
 @bot.tree.command(name="listplayers", description="Show all current participants in the PPE contest.", guilds=guilds)
@@ -288,13 +516,19 @@ async def listplayers(interaction: discord.Interaction):
     if not members:
         return await interaction.response.send_message("❌ No one has been added to the PPE contest yet.")
 
-    lines = ["`🏆 Current PPE Contest Participants 🏆`"]
-    for name, data in members:
-        ppe_count = len(data.get("ppes", []))
-        active_id = data.get("active_ppe")
-        lines.append(f"• `{name.title()}` — {ppe_count} PPE(s), Active: PPE #{active_id}")
-
-    await interaction.response.send_message("\n".join(lines))
+    def render(page):
+        lines = []
+        for name, data in members[page * LIST_PAGE_SIZE:(page + 1) * LIST_PAGE_SIZE]:
+            ppe_count = len(data.get("ppes", []))
+            active_id = data.get("active_ppe")
+            lines.append(f"• `{name.title()}` — {ppe_count} PPE(s), Active: PPE #{active_id}")
+        return lines
+
+    view = PaginatorView(
+        "🏆 Current PPE Contest Participants 🏆", page_count(len(members), LIST_PAGE_SIZE), render,
+        interaction.user.id, cache_key=("listplayers", guild_id), version=records_version(guild_id),
+    )
+    await view.send(interaction)
 
 
 @bot.tree.command(name="addplayer", description="Add a player to the PPE contest and create their first active PPE.", guilds=guilds)
@@ -309,23 +543,23 @@ async def addplayer(interaction: discord.Interaction, member: discord.Member):
     - Gives them access to all PPE commands
     """
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
     key = member.display_name.lower()
-
-    if key in records:
-        return await interaction.response.send_message(f"⚠️ {member.display_name} is already in the PPE contest.")
-
-    # Create player entry
-    records[key] = {
-        "ppes": [
-            {"id": 1, "name": "PPE #1", "points": 0, "items": []}
-        ],
-        "active_ppe": 1,
-        "is_member": True  # mark as officially added
-    }
-
-    await save_player_records(guild_id=guild_id, records=records)
-    await interaction.response.send_message(f"✅ Added `{member.display_name}` to the PPE contest and created `PPE #1` as their active PPE.")
+    async with guild_records(guild_id) as records:
+        if key in records:
+            reply = f"⚠️ {member.display_name} is already in the PPE contest."
+        else:
+            # Create player entry
+            records[key] = {
+                "ppes": [
+                    {"id": 1, "name": "PPE #1", "points": 0, "items": []}
+                ],
+                "active_ppe": 1,
+                "is_member": True  # mark as officially added
+            }
+            update_leaderboard(guild_id, key, records[key])
+            reply = f"✅ Added `{member.display_name}` to the PPE contest and created `PPE #1` as their active PPE."
+
+    await interaction.response.send_message(reply)
 
 @bot.tree.command(name="removeplayer", description="Remove a player and all their PPE data from the contest.", guilds=guilds)
 # @commands.has_role("PPE Admin")
@@ -333,17 +567,17 @@ async def addplayer(interaction: discord.Interaction, member: discord.Member):
 async def removeplayer(interaction: discord.Interaction, member: discord.Member):
     await remove_ppe_player_role(interaction, member)
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
     key = member.display_name.lower()
+    async with guild_records(guild_id) as records:
+        if key not in records or not records[key].get("is_member", False):
+            reply = f"❌ {member.display_name} is not in the PPE contest."
+        else:
+            # Confirm removal
+            del records[key]
+            remove_from_leaderboard(guild_id, key)
+            reply = f"🗑️ Removed `{member.display_name}` and all their PPE data from the contest."
 
-    if key not in records or not records[key].get("is_member", False):
-        return await interaction.response.send_message(f"❌ {member.display_name} is not in the PPE contest.")
-
-    # Confirm removal
-    del records[key]
-    await save_player_records(guild_id=guild_id, records=records)
-
-    await interaction.response.send_message(f"🗑️ Removed `{member.display_name}` and all their PPE data from the contest.")
+    await interaction.response.send_message(reply)
 
 
 
@@ -361,90 +595,71 @@ async def myppe(interaction: discord.Interaction):
     player_data = records[key]
     active_id = player_data.get("active_ppe")
 
-    lines = [f"`{interaction.user.display_name}'s PPEs:`"]
+    lines = []
     for ppe in sorted(player_data["ppes"], key=lambda x: x["id"]):
         id_ = ppe["id"]
         pts = ppe.get("points", 0)
         marker = "✅ (Active)" if id_ == active_id else ""
         lines.append(f"• PPE #{id_}: {pts:.1f} points {marker}")
 
-    await interaction.response.send_message("\n".join(lines))
+    pages, render = list_pages(lines, LIST_PAGE_SIZE)
+    await PaginatorView(f"{interaction.user.display_name}'s PPEs", pages, render, interaction.user.id).send(interaction)
 
 
 @bot.tree.command(name="leaderboard", description="Show the best PPE from each player.", guilds=guilds)
-async def leaderboard(interaction: discord.Interaction):
+async def leaderboard(interaction: discord.Interaction, page: int = 1):
     guild_id = interaction.guild.id
-    records = await load_player_records(guild_id)
-
-    leaderboard_data = []
-    for player, data in records.items():
-        if not data["ppes"]:
-            continue
-        best_ppe = max(data["ppes"], key=lambda p: p["points"])
-        leaderboard_data.append((player, best_ppe["id"], best_ppe["points"]))
-
-    leaderboard_data.sort(key=lambda x: x[2], reverse=True)
-
-    lines = ["🏆 `Best PPE Leaderboard` 🏆"]
-    for rank, (player, ppe_id, pts) in enumerate(leaderboard_data, start=1):
-        lines.append(f"{rank}. `{player.title()}` — PPE #{ppe_id}: {pts:.1f} points")
-
-    await interaction.response.send_message("\n".join(lines))
-
+    index = await get_leaderboard(guild_id)
+    if not len(index):
+        return await interaction.response.send_message("❌ No PPEs on the leaderboard yet.")
+
+    def render(page):
+        return [
+            f"{rank}. `{player.title()}` — PPE #{ppe_id}: {pts:.1f} points"
+            for rank, player, ppe_id, pts in index.page(page * LEADERBOARD_PAGE_SIZE)
+        ]
+
+    footer = None
+    my_rank = index.rank(interaction.user.display_name.lower())
+    if my_rank:
+        rank, ppe_id, pts = my_rank
+        footer = f"You: #{rank} — PPE #{ppe_id}: {pts:.1f} points"
+
+    view = PaginatorView(
+        "🏆 Best PPE Leaderboard 🏆", page_count(len(index), LEADERBOARD_PAGE_SIZE), render,
+        interaction.user.id, page=page - 1, cache_key=("leaderboard", guild_id),
+        version=records_version(guild_id), footer=footer,
+    )
+    await view.send(interaction)
 
-import json, os
 
 ######################
 #### PPE CHANNELS ####
 ######################
 
-PPE_CHANNEL_FILE = "./ppe_channels.json"
-
-def load_ppe_channels():
-    if os.path.exists(PPE_CHANNEL_FILE):
-        with open(PPE_CHANNEL_FILE, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                return data.get("ppe_channels", [])
-            except json.JSONDecodeError:
-                return []
-    return []
-
-def save_ppe_channels(channel_ids):
-    with open(PPE_CHANNEL_FILE, "w", encoding="utf-8") as f:
-        json.dump({"ppe_channels": channel_ids}, f, indent=2)
-
 @bot.tree.command(name="setppechannel", description="Mark this channel as a PPE channel.", guilds=guilds)
 # @commands.has_role("PPE Admin")
 @require_ppe_roles(admin_required=True)
 async def set_ppe_channel(interaction: discord.Interaction):
-    channel_id = interaction.channel.id
-    channels = load_ppe_channels()
-    if channel_id in channels:
+    if not add_ppe_channel(interaction.guild.id, interaction.channel.id):
         return await interaction.response.send_message("⚠️ This channel is already set as a PPE channel.")
 
-    channels.append(channel_id)
-    save_ppe_channels(channels)
     await interaction.response.send_message(f"✅ Added `#{interaction.channel.name}` as a PPE channel.")
 
 @bot.tree.command(name="unsetppechannel", description="Remove this channel from PPE channels.", guilds=guilds)
 # @commands.has_role("PPE Admin")
 @require_ppe_roles(admin_required=True)
 async def unset_ppe_channel(interaction: discord.Interaction):
-    channel_id = interaction.channel.id
-    channels = load_ppe_channels()
-    if channel_id not in channels:
+    if not remove_ppe_channel(interaction.guild.id, interaction.channel.id):
         return await interaction.response.send_message("⚠️ This channel is not currently a PPE channel.")
 
-    channels.remove(channel_id)
-    save_ppe_channels(channels)
     await interaction.response.send_message(f"🗑️ Removed `#{interaction.channel.name}` from the PPE channel list.")
 
 @bot.tree.command(name="listppechannels", description="Show all channels marked as PPE channels.", guilds=guilds)
 # @commands.has_role("PPE Admin")
 @require_ppe_roles(admin_required=True)
 async def list_ppe_channels(interaction: discord.Interaction):
-    channels = load_ppe_channels()
+    channels = get_ppe_channels(interaction.guild.id)
     if not channels:
         return await interaction.response.send_message("❌ No PPE channels have been set yet. Use `/setppechannel` in one.")
     lines = ["`📜 PPE Channels:`"]
@@ -482,6 +697,8 @@ async def ppehelp(interaction: discord.Interaction):
         "removeplayer": "Remove a member from the PPE contest.",
         "listplayers": "List all current participants in the PPE contest.",
         "addpointsfor": "Add points to another player's active PPE.",
+        "reloadpoints": "Reload the loot points table from disk.",
+        "botstats": "Show loot pipeline timings and queue depths.",
     }
     owner_cmds = {
         "giveppeadminrole": "Give the PPE Admin role to a member.",
@@ -592,9 +809,11 @@ async def remove_ppe_player_role(interaction: discord.Interaction, member: disco
 # --- Command: list roles ---
 @bot.tree.command(name="listroles", description="List all roles in this server.", guilds=guilds)
 async def list_roles(interaction: discord.Interaction):
-    roles = [r.name for r in interaction.guild.roles if r.name != "@everyone"]
-    await interaction.response.send_message("🎭 Available roles:\n" + "\n".join(f"- {r}" for r in roles))
+    roles = [f"- {r.name}" for r in interaction.guild.roles if r.name != "@everyone"]
+    pages, render = list_pages(roles, LIST_PAGE_SIZE)
+    await PaginatorView("🎭 Available roles", pages, render, interaction.user.id).send(interaction)
 
 
 
-bot.run(DISCORD_TOKEN)
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
@@ -1,15 +1,48 @@
+import hashlib
+import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 from bs4 import BeautifulSoup
 
+from utils.atomic_io import write_json_atomic
+
+# lxml is several times faster than the pure-Python parser; use it when installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 # === Configuration ===
 HTML_FOLDER = "dungeon_htmls"             # Folder with dungeon HTMLs
 LOOT_TABLE_FILE = "rotmg_loot_drops.csv"  # Your master loot table
 DUNGEONS_FILE = "dungeon_difficulty.csv"            # Dungeon name + difficulty (no header row!)
+CACHE_FILE = "drops_of_interest_cache.json"         # Input fingerprints + per-page mtime/size/hash and parsed drops
+# Set SCRAPE_FULL=1 to re-parse every page even if it has not changed
+FULL_RESCAN = os.getenv("SCRAPE_FULL", "0") == "1"
+SKIP_KEYWORDS = ["Potion", "Mark of", " Rune", "Tier "]
+
+# The section header, e.g. <h2 id="interest">Drops of Interest</h2> (some pages use h3)
+DROPS_HEADER = re.compile(r"<h([23])[^>]*>\s*Drops of Interest\s*</h\1>", re.IGNORECASE)
+
+
+def drops_section(html_text):
+    """Slice of the page from the 'Drops of Interest' header to the end of its table."""
+    match = DROPS_HEADER.search(html_text)
+    if not match:
+        return None
+    end = html_text.find("</table>", match.end())
+    return html_text[match.start():] if end == -1 else html_text[match.start():end + len("</table>")]
+
 
 def extract_drops_of_interest(html_text):
     """Extracts all item names from the 'Drops of Interest' section."""
-    soup = BeautifulSoup(html_text, "html.parser")
+    # Only parse the section itself; full pages are hundreds of KB
+    section = drops_section(html_text)
+    soup = BeautifulSoup(section if section is not None else html_text, HTML_PARSER)
     header = soup.find("h2", string="Drops of Interest")
     if not header:
         header = soup.find("h3", string="Drops of Interest")
@@ -33,6 +66,63 @@ def extract_drops_of_interest(html_text):
     return drops
 
 
+def parse_dungeon_file(path):
+    """Worker: read one saved page and return its drops."""
+    with open(path, "r", encoding="utf-8") as f:
+        return extract_drops_of_interest(f.read())
+
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest}
+
+
+def input_fingerprints():
+    """Fingerprints of the loot table and difficulty list the additions depend on."""
+    return {path: file_fingerprint(path) for path in (LOOT_TABLE_FILE, DUNGEONS_FILE)}
+
+
+def load_cache():
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    # Caches from before input fingerprints were tracked are parsed again
+    if "pages" not in cache:
+        cache = {"inputs": {}, "pages": {}}
+    return cache
+
+
+def save_cache(cache):
+    write_json_atomic(CACHE_FILE, cache)
+
+
+def changed_files(files, pages):
+    """
+    Split pages into (changed, unchanged). A page whose mtime and size
+    match the cache is unchanged; otherwise its hash decides (a touched
+    but identical file is not parsed again).
+    """
+    changed, unchanged = [], []
+    for file in files:
+        path = os.path.join(HTML_FOLDER, file)
+        entry = pages.get(file)
+        st = os.stat(path)
+        if not FULL_RESCAN and entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            unchanged.append(file)
+            continue
+        fingerprint = file_fingerprint(path)
+        if not FULL_RESCAN and entry and entry["sha256"] == fingerprint["sha256"]:
+            entry.update(fingerprint)
+            unchanged.append(file)
+            continue
+        changed.append((file, fingerprint))
+    return changed, unchanged
+
+
 def main():
     # === Load master loot table ===
     loot_df = pd.read_csv(LOOT_TABLE_FILE)
@@ -40,15 +130,15 @@ def main():
     # Ensure Points column exists and initialize all to 10
     # loot_df["Points"] = 10.0
     loot_df["Item Name Lower"] = loot_df["Item Name"].str.lower().str.strip()
+    known_items = set(loot_df["Item Name Lower"])
 
     # === Load dungeon difficulties (no header in your file) ===
     dungeons_df = pd.read_csv(DUNGEONS_FILE, header=None, names=["Dungeon Name", "Difficulty"])
     dungeons_df["Dungeon Name Lower"] = dungeons_df["Dungeon Name"].str.lower().str.strip()
 
-    total_updated = 0
-
-    # === Process every dungeon HTML file ===
-    for file in os.listdir(HTML_FOLDER):
+    # === Pick the dungeon HTML files that have a difficulty ===
+    difficulties = {}
+    for file in sorted(os.listdir(HTML_FOLDER)):
         if not file.endswith(".html"):
             continue
 
@@ -58,13 +148,40 @@ def main():
             print(f"[!] Skipping {file}: no difficulty found in dungeons.csv")
             continue
 
-        difficulty = float(dungeons_df.loc[match, "Difficulty"].iloc[0])
-
-        path = os.path.join(HTML_FOLDER, file)
-        with open(path, "r", encoding="utf-8") as f:
-            html_text = f.read()
-
-        drops = extract_drops_of_interest(html_text)
+        difficulties[file] = float(dungeons_df.loc[match, "Difficulty"].iloc[0])
+
+    # === Parse only new or changed pages (in parallel when there are several) ===
+    cache = load_cache()
+    pages = cache["pages"]
+    inputs = input_fingerprints()
+    changed, unchanged = changed_files(difficulties, pages)
+    print(f"[i] {len(changed)} changed page(s), {len(unchanged)} unchanged (parser: {HTML_PARSER})")
+
+    # Nothing to redo when no page, the loot table or the difficulties changed
+    if not changed and not FULL_RESCAN and cache["inputs"] == inputs and pages.keys() == difficulties.keys():
+        save_cache(cache)
+        print(f"[✓] {LOOT_TABLE_FILE} already up to date")
+        return
+
+    paths = [os.path.join(HTML_FOLDER, file) for file, _ in changed]
+    if len(paths) > 1:
+        with ProcessPoolExecutor() as pool:
+            parsed = list(pool.map(parse_dungeon_file, paths))
+    else:
+        parsed = [parse_dungeon_file(path) for path in paths]
+
+    for (file, fingerprint), drops in zip(changed, parsed):
+        pages[file] = {**fingerprint, "drops": drops}
+    # Pages that were removed or lost their difficulty are forgotten
+    for file in pages.keys() - difficulties.keys():
+        del pages[file]
+
+    # === Rebuild additions from every page's drops against the current table ===
+    # (cached drops included, so a regenerated table or a new difficulty is filled in again)
+    total_updated = 0
+    new_rows = []
+    for file, difficulty in difficulties.items():
+        drops = pages[file]["drops"]
         if not drops:
             print(f"[!] No drops found for {file}")
             continue
@@ -74,30 +191,40 @@ def main():
             drop_clean = drop.strip()
 
             # Skip unwanted items
-            if any(keyword in drop_clean for keyword in ["Potion", "Mark of", " Rune", "Tier "]):
+            if any(keyword in drop_clean for keyword in SKIP_KEYWORDS):
                 continue
+            # Already in the table (from an earlier run or another dungeon)
+            if drop_clean.lower() in known_items:
+                continue
+            known_items.add(drop_clean.lower())
 
-            # Append new loot entry directly
-            new_entry = {
+            # Append new loot entry
+            new_rows.append({
                 "Loot Type": "White or ST",
                 "Item Name": drop_clean,
                 "Points": difficulty
-            }
-
-            loot_df.loc[len(loot_df)] = new_entry
+            })
             added += 1
 
         total_updated += added
-        print(f"[✓] {file}: added {added} new drops (+{difficulty} points each)")
-
+        if added:
+            print(f"[✓] {file}: added {added} new drops (+{difficulty} points each)")
 
     # === Save updates ===
-    loot_df.drop(columns=["Item Name Lower"], inplace=True)
-    loot_df.to_csv(LOOT_TABLE_FILE, index=False, encoding="utf-8")
+    if new_rows:
+        loot_df = pd.concat([loot_df, pd.DataFrame(new_rows)], ignore_index=True)
+        loot_df.drop(columns=["Item Name Lower"], inplace=True)
+        loot_df.to_csv(LOOT_TABLE_FILE, index=False, encoding="utf-8")
+        inputs = input_fingerprints()
+    # Only remember pages and inputs once their drops are saved
+    cache["inputs"] = inputs
+    save_cache(cache)
 
-    print(f"\n[✓] Initialized all drops to 10 points.")
     print(f"[✓] Updated {total_updated} total items with dungeon difficulty points.")
-    print(f"[✓] Saved changes to {LOOT_TABLE_FILE}")
+    if new_rows:
+        print(f"[✓] Saved changes to {LOOT_TABLE_FILE}")
+    else:
+        print(f"[✓] {LOOT_TABLE_FILE} already up to date")
 
 if __name__ == "__main__":
     main()
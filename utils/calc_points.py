@@ -1,76 +1,68 @@
+import math
 
-LOOT_POINTS_CSV = "./rotmg_loot_drops_updated.csv"
-import csv
 PLAYER_RECORD_FILE = "./guild_loot_records.json"
-from utils.player_records import load_player_records, save_player_records
-
-# --- Load points table from CSV ---
-def load_loot_points():
-    loot_points = {}
-    with open(LOOT_POINTS_CSV, newline='', encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            name = row["Item Name"].strip().lower()
-            points = float(row["Points"])
-            loot_points[name] = points
-    return loot_points
+from utils.player_records import add_ppe_item, guild_records, item_counts
+from utils.leaderboard import update_player as update_leaderboard
+from utils.points_table import get_points_table, normalize_item_name
 
 
 async def calculate_loot_points(guild_id, player_name, detected_items):
-    loot_points = load_loot_points()
+    loot_points = get_points_table()
     
     # guild_id = ctx.guild.id
-    records = await load_player_records(guild_id)
-    key = player_name.lower()
+    # Validation and scoring share one transaction: a ValueError leaves
+    # the records untouched, otherwise every item is saved together.
+    async with guild_records(guild_id) as records:
+        key = player_name.lower()
 
-    if key not in records or not records[key].get("is_member", False):
-        raise ValueError(f"{player_name} is not a contest member.")
+        if key not in records or not records[key].get("is_member", False):
+            raise ValueError(f"{player_name} is not a contest member.")
 
-    player_data = records[key]
-    active_id = player_data.get("active_ppe")
-    if not active_id:
-        raise ValueError(f"{player_name} has no active PPE.")
+        player_data = records[key]
+        active_id = player_data.get("active_ppe")
+        if not active_id:
+            raise ValueError(f"{player_name} has no active PPE.")
 
-    # --- get active PPE object ---
-    active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None)
-    if not active_ppe:
-        raise ValueError(f"Active PPE (#{active_id}) not found for {player_name}.")
+        # --- get active PPE object ---
+        active_ppe = next((p for p in player_data["ppes"] if p["id"] == active_id), None)
+        if not active_ppe:
+            raise ValueError(f"Active PPE (#{active_id}) not found for {player_name}.")
 
-    results = []
+        results = []
+        # Copies owned per normalized item name; O(1) duplicate checks
+        owned = item_counts(active_ppe)
 
-    for item in detected_items:
-        item_name = item["item"].lower()
-        base_points = loot_points.get(item_name, 0)
+        for item in detected_items:
+            item_name = item.get("key") or normalize_item_name(item["item"])
+            base_points = loot_points.get(item_name, 0)
 
-        # Skip items with no point value
-        if base_points <= 0:
-            continue
+            # Skip items with no point value
+            if base_points <= 0:
+                continue
 
-        if base_points != 1:
+            if base_points != 1:
 
-            # --- check duplicate inside this PPE's item list ---
-            existing_items = [i.lower() for i in active_ppe.get("items", [])]
-            is_duplicate = item_name in existing_items
-            final_points = base_points / 2 if is_duplicate else base_points
+                # --- check duplicate inside this PPE's items ---
+                is_duplicate = owned.get(item_name, 0) > 0
+                final_points = base_points / 2 if is_duplicate else base_points
 
-            # --- round down to nearest 0.5 ---
-            import math
-            final_points = math.floor(final_points * 2) / 2
-        else:
-            is_duplicate = False
-            final_points = 1
+                # --- round down to nearest 0.5 ---
+                final_points = math.floor(final_points * 2) / 2
+            else:
+                is_duplicate = False
+                final_points = 1
 
-        # --- update PPE items + points ---
-        if not is_duplicate:
-            active_ppe.setdefault("items", []).append(item_name)
-        active_ppe["points"] = active_ppe.get("points", 0) + final_points
+            # --- update PPE items + points (duplicates are counted, not listed) ---
+            copy_number = add_ppe_item(active_ppe, item_name, listed=not is_duplicate)
+            active_ppe["points"] = active_ppe.get("points", 0) + final_points
 
-        results.append({
-            "item": item["item"],
-            "points": final_points,
-            "duplicate": is_duplicate
-        })
+            results.append({
+                "item": item["item"],
+                "points": final_points,
+                "duplicate": is_duplicate,
+                "copy": copy_number,
+            })
+
+        update_leaderboard(guild_id, key, player_data)
 
-    
-    await save_player_records(guild_id=guild_id, records=records)
     return results, active_ppe["points"]
\ No newline at end of file
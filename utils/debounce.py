@@ -0,0 +1,62 @@
+import asyncio
+
+
+class Debouncer:
+    """
+    Collect items per key and hand them to `callback(key, items)` once no
+    new item has arrived for `window` seconds. A batch never waits longer
+    than `max_wait` seconds after its first item, so a steady trickle of
+    posts still gets processed.
+    """
+
+    def __init__(self, window, callback, max_wait=None):
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else window * 5
+        self.callback = callback
+        self._batches = {}   # key -> {"items": [...], "first": t, "task": Task}
+        self._running = set()
+
+    @property
+    def waiting(self):
+        """Batches still inside their debounce window."""
+        return len(self._batches)
+
+    def add(self, key, item):
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = {"items": [], "first": loop.time(), "task": None}
+            self._batches[key] = batch
+        else:
+            batch["task"].cancel()
+        batch["items"].append(item)
+
+        remaining = batch["first"] + self.max_wait - loop.time()
+        delay = max(0.0, min(self.window, remaining))
+        batch["task"] = asyncio.create_task(self._fire_after(key, delay))
+
+    async def _fire_after(self, key, delay):
+        await asyncio.sleep(delay)
+        # Once popped, later adds start a fresh batch instead of cancelling this one
+        batch = self._batches.pop(key)
+        await self._run(key, batch["items"])
+
+    async def _run(self, key, items):
+        task = asyncio.current_task()
+        self._running.add(task)
+        try:
+            await self.callback(key, items)
+        except Exception as e:
+            print(f"⚠️ Batch for {key} failed: {e}")
+        finally:
+            self._running.discard(task)
+
+    async def flush(self):
+        """Run every waiting batch now and wait for in-flight ones (for shutdown)."""
+        batches, self._batches = self._batches, {}
+        for batch in batches.values():
+            batch["task"].cancel()
+        running = list(self._running)
+        await asyncio.gather(*(self._run(key, batch["items"]) for key, batch in batches.items()))
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
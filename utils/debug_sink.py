@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+
+import cv2
+
+# --- Configuration (all off by default) ---
+# Keep every Nth detection's artifacts (0 = never)
+DEBUG_SAMPLE_EVERY = int(os.getenv("DEBUG_SAMPLE_EVERY", "0"))
+# Also keep any detection with a slot scoring in [DEBUG_LOW_CONFIDENCE, threshold)
+DEBUG_LOW_CONFIDENCE = float(os.getenv("DEBUG_LOW_CONFIDENCE", "0"))
+# Per-slot debug prints
+DEBUG_VERBOSE = os.getenv("DEBUG_VERBOSE", "0") == "1"
+# Disk budget shared by all artifact folders and all worker processes;
+# oldest files are evicted first
+DEBUG_MAX_BYTES = int(float(os.getenv("DEBUG_MAX_MB", "200")) * 1024 * 1024)
+
+# Where artifacts go: the cropped loot GUI, the annotated GUI and the slot grid
+CROPPED_FOLDER = os.getenv("DEBUG_CROPPED_DIR", "./cropped")
+ANNOTATED_FOLDER = os.getenv("DEBUG_ANNOTATED_DIR", "./debug")
+SLOTS_FOLDER = os.getenv("DEBUG_SLOTS_DIR", "./debug_slots")
+ARTIFACT_FOLDERS = (CROPPED_FOLDER, ANNOTATED_FOLDER, SLOTS_FOLDER)
+QUEUE_SIZE = 32
+
+
+class DebugSink:
+    """
+    Writes detector debug images from a background thread.
+
+    Callers ask should_capture() after matching and only then draw and
+    submit() their images, so a request that is not sampled pays nothing.
+    If the writer falls behind, new artifacts are dropped rather than
+    slowing detection down.
+    """
+
+    def __init__(self, sample_every=DEBUG_SAMPLE_EVERY, low_confidence=DEBUG_LOW_CONFIDENCE,
+                 max_bytes=DEBUG_MAX_BYTES, verbose=DEBUG_VERBOSE, folders=ARTIFACT_FOLDERS):
+        self.sample_every = sample_every
+        self.low_confidence = low_confidence
+        self.max_bytes = max_bytes
+        self.verbose = verbose
+        self.folders = folders
+        self._calls = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.sample_every > 0 or self.low_confidence > 0
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def should_capture(self, best_scores, threshold):
+        """Decide once per detection, after matching, whether to keep artifacts."""
+        if not self.enabled:
+            return False
+        self._calls += 1
+        if self.sample_every and self._calls % self.sample_every == 0:
+            return True
+        if self.low_confidence:
+            return any(self.low_confidence <= s < threshold for s in best_scores)
+        return False
+
+    def submit(self, artifacts):
+        """Queue {path: image} for writing; silently dropped if the queue is full."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="debug-sink", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(artifacts)
+        except queue.Full:
+            pass
+
+    # --- Writer thread ---
+
+    def _scan(self):
+        """(mtime, path, size) of every artifact on disk, oldest first."""
+        entries = []
+        for folder in self.folders:
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime, entry.path, st.st_size))
+                except OSError:
+                    continue  # removed by another worker meanwhile
+        entries.sort()
+        return entries
+
+    def _evict(self):
+        """
+        Enforce the cap from what is actually on disk, not from what this
+        process wrote: every worker has its own sink, and the folders
+        (and earlier runs' files) are shared by all of them.
+        """
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _run(self):
+        while True:
+            artifacts = self._queue.get()
+            for path, img in artifacts.items():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if cv2.imwrite(path, img):
+                    self.log(f"🖼️ Saved debug artifact: {path}")
+            self._evict()
+
+
+_sink = None
+
+def get_debug_sink():
+    """Process-wide sink (one per detection worker)."""
+    global _sink
+    if _sink is None:
+        _sink = DebugSink()
+    return _sink
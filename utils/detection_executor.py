@@ -0,0 +1,147 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import metrics
+from utils.find_items import DETECT_STAGES, detect_loot
+from utils.template_bank import TEMPLATES_FOLDER, get_template_bank
+
+
+class DetectionQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+# -------------------------------------------------------------------------
+# Worker-process side
+# -------------------------------------------------------------------------
+
+def _init_worker(templates_folder):
+    """Runs once in each worker: load the template bank before any job."""
+    get_template_bank(templates_folder)
+
+def _warm_up():
+    return True
+
+def _detect(screenshot, templates_folder, name):
+    return detect_loot(screenshot, templates_folder=templates_folder, name=name)
+
+
+# -------------------------------------------------------------------------
+# Event-loop side
+# -------------------------------------------------------------------------
+
+class DetectionExecutor:
+    """
+    Runs detect_loot in a pool of worker processes so the
+    discord.py event loop never blocks on template matching.
+
+    At most `workers` jobs run at once and at most `queue_size` more may
+    wait behind them; anything beyond that is rejected with
+    DetectionQueueFull so callers can tell the player to retry.
+    """
+
+    def __init__(self, workers=2, queue_size=8, templates_folder=TEMPLATES_FOLDER):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.templates_folder = templates_folder
+        self._pool = None
+        self._slots = None
+        self._pending = 0
+        # Slot cache counters reported back by the workers
+        self.slot_cache_hits = 0
+        self.slot_cache_misses = 0
+
+    @property
+    def pending(self):
+        """Jobs currently running or waiting."""
+        return self._pending
+
+    @property
+    def queued(self):
+        """Jobs waiting for a free worker."""
+        return max(0, self._pending - self.workers)
+
+    @property
+    def slot_cache_hit_rate(self):
+        total = self.slot_cache_hits + self.slot_cache_misses
+        return self.slot_cache_hits / total if total else 0.0
+
+    async def start(self):
+        """Create the pool and make every worker map the template bank."""
+        if self._pool is not None:
+            return
+        # Build the memory-mapped template cache once here, so workers only map it
+        await asyncio.to_thread(get_template_bank, self.templates_folder)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pool = self._new_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_up) for _ in range(self.workers)))
+        print(f"🧵 Detection pool ready ({self.workers} workers, queue of {self.queue_size})")
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.templates_folder,),
+        )
+
+    def _replace_broken_pool(self, pool):
+        """A worker died (OOM, a hostile image...): swap in a fresh pool once."""
+        if self._pool is not pool:
+            return  # another job already replaced it
+        print("⚠️ A detection worker died; restarting the detection pool")
+        metrics.inc("detection_pool_restarts_total")
+        pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def detect(self, screenshot, on_queued=None, name=None):
+        """
+        Detect items in a screenshot (path or encoded image bytes) on a
+        worker process. Returns detect_loot's result dict. If the worker
+        dies, the pool is rebuilt and BrokenProcessPool is raised for this
+        screenshot only.
+
+        If every worker is busy, `on_queued(position)` is awaited first so
+        the caller can tell the player where they are in line.
+        """
+        if self._pool is None:
+            await self.start()
+
+        if self._pending >= self.workers + self.queue_size:
+            metrics.inc("detections_rejected_total")
+            raise DetectionQueueFull()
+
+        self._pending += 1
+        try:
+            position = self._pending - self.workers
+            if position > 0 and on_queued is not None:
+                await on_queued(position)
+
+            submitted = time.perf_counter()
+            async with self._slots:
+                started = time.perf_counter()
+                metrics.observe_stage("queue_wait", (started - submitted) * 1000)
+                loop = asyncio.get_running_loop()
+                pool = self._pool
+                try:
+                    result = await loop.run_in_executor(pool, _detect, screenshot, self.templates_folder, name)
+                except BrokenProcessPool:
+                    self._replace_broken_pool(pool)
+                    raise
+                metrics.observe_stage("detect", (time.perf_counter() - started) * 1000)
+            self.slot_cache_hits += result["slot_cache"]["hits"]
+            self.slot_cache_misses += result["slot_cache"]["misses"]
+            # Worker-side stage timings come back with the result
+            for stage in DETECT_STAGES[:-1]:
+                if stage in result["timings"]:
+                    metrics.observe_stage(stage, result["timings"][stage])
+            metrics.inc("screenshots_detected_total")
+            return result
+        finally:
+            self._pending -= 1
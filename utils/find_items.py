@@ -1,37 +1,141 @@
 import cv2
+import hashlib
 import numpy as np
 import os
+import time
+
+from utils.debug_sink import ANNOTATED_FOLDER, CROPPED_FOLDER, SLOTS_FOLDER, get_debug_sink
+from utils.gui_locator import REFERENCE_BOX, locate_loot_gui
+from utils.image_hash import FRAME_HASH_SIZE, GUI_HASH_SIZE, dhash
+from utils.lru import LRUCache
+from utils.matcher import top_matches
+from utils.template_bank import TEMPLATES_FOLDER, get_template_bank
+
+
+def load_screenshot(screenshot):
+    """
+    Decode a screenshot given as a file path, encoded image bytes (e.g.
+    from attachment.read()) or an already-decoded BGR array.
+    Returns None if it cannot be decoded.
+    """
+    if isinstance(screenshot, np.ndarray):
+        return screenshot
+    if isinstance(screenshot, (bytes, bytearray, memoryview)):
+        # PNG/JPEG have no region-of-interest decode in OpenCV; decode from the buffer
+        return cv2.imdecode(np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imread(screenshot)
+
+
+# Recent results per exact loot GUI crop, so re-posted screenshots skip matching
+GUI_CACHE_SIZE = 256
+_gui_results = LRUCache(GUI_CACHE_SIZE)
+
+# Best (item, score) per exact 40x40 slot image; common drops render pixel-identically
+SLOT_CACHE_SIZE = 4096
+
+EMPTY_SLOT_VARIANCE = 5
+_slot_results = LRUCache(SLOT_CACHE_SIZE)
+
+
+def slot_digest(slot_img):
+    return hashlib.blake2b(slot_img.tobytes(), digest_size=16).digest()
+
+
+def clear_caches():
+    """Forget cached GUI and slot results (e.g. to time the cold path)."""
+    _gui_results.clear()
+    _slot_results.clear()
+
+
+DETECT_STAGES = ("decode", "locate", "hash", "slots", "match", "total")
+
+def _lap(timings, stage, start):
+    """Record the milliseconds spent in `stage` since `start`; returns now."""
+    now = time.perf_counter()
+    timings[stage] = (now - start) * 1000
+    return now
 
 
 def find_items_in_image(
-    screenshot_path,
-    templates_folder="./sprites/",
+    screenshot,
+    templates_folder=TEMPLATES_FOLDER,
     threshold=0.85,
-    debug_output="./debug/"
+    debug_output=ANNOTATED_FOLDER,
+    name=None
 ):
     """
     Detects loot items in a RotMG screenshot by checking 8 known slots
     within the loot GUI (2x4 grid in bottom-right corner).
     Optimized: crops 70x70 center area from each slot, resizes to 40x40
     to match sprite resolution, and uses alpha masks for accuracy.
+
+    `screenshot` may be a path, encoded image bytes or a BGR array;
+    `name` labels the debug images (defaults to the file name).
+    """
+    return detect_loot(screenshot, templates_folder, threshold, debug_output, name)["items"]
+
+
+def detect_loot(
+    screenshot,
+    templates_folder=TEMPLATES_FOLDER,
+    threshold=0.85,
+    debug_output=ANNOTATED_FOLDER,
+    name=None
+):
     """
+    find_items_in_image plus the perceptual hashes used for repost checks:
+    returns {"items": [...], "gui_hash": hex, "frame_hash": hex,
+    "slot_cache": {"hits": n, "misses": n}, "timings": {stage: ms}}
+    (hashes are None if the screenshot could not be read; timings only
+    lists the DETECT_STAGES that ran, plus "total").
+    """
+    started = time.perf_counter()
+    timings = {}
+    result = {"items": [], "gui_hash": None, "frame_hash": None,
+              "slot_cache": {"hits": 0, "misses": 0}, "timings": timings}
+    if name is None:
+        name = os.path.basename(screenshot) if isinstance(screenshot, str) else "screenshot.png"
 
     # --- 1. Load screenshot ---
-    img = cv2.imread(screenshot_path)
+    img = load_screenshot(screenshot)
+    lap = _lap(timings, "decode", started)
     if img is None:
-        print(f"⚠️ Could not read {screenshot_path}")
-        return []
-
-    # --- 2. Crop loot GUI (bottom-right corner) ---
-    x0, y0, x1, y1 = 1575, 908, 1905, 1072
-    loot_gui = img[y0:y1, x0:x1]
+        print(f"⚠️ Could not read {name}")
+        _lap(timings, "total", started)
+        return result
+
+    # --- 2. Locate + crop loot GUI (any resolution), normalize to 1080p size ---
+    x0, y0, x1, y1 = locate_loot_gui(img)
+    # Keep only the crop; the full frame can be freed right away
+    loot_gui = img[y0:y1, x0:x1].copy()
+    result["frame_hash"] = f"{dhash(img, FRAME_HASH_SIZE):016x}"
+    del img
+    if loot_gui.size == 0:
+        print(f"⚠️ No loot GUI area in {name}")
+        _lap(timings, "total", started)
+        return result
+
+    ref_x0, ref_y0, ref_x1, ref_y1 = REFERENCE_BOX
+    ref_w, ref_h = ref_x1 - ref_x0, ref_y1 - ref_y0
+    if loot_gui.shape[:2] != (ref_h, ref_w):
+        shrink = loot_gui.shape[1] > ref_w
+        loot_gui = cv2.resize(loot_gui, (ref_w, ref_h),
+                              interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LINEAR)
     loot_h, loot_w = loot_gui.shape[:2]
-
-    # --- Save cropped source image for debugging ---
-    os.makedirs("./cropped", exist_ok=True)
-    crop_path = os.path.join("./cropped", os.path.basename(screenshot_path))
-    cv2.imwrite(crop_path, loot_gui)
-    print(f"🖼️ Saved cropped source: {crop_path}")
+    lap = _lap(timings, "locate", lap)
+
+    # --- Same loot GUI seen recently: reuse its detections ---
+    bank = get_template_bank(templates_folder)
+    result["gui_hash"] = f"{dhash(loot_gui, GUI_HASH_SIZE):064x}"
+    # Exact pixels, not the perceptual hash: look-alike bags (e.g. an item and
+    # its shiny) can share a dhash but must not share detections
+    cache_key = (bank.signature, threshold, slot_digest(loot_gui))
+    cached = _gui_results.get(cache_key)
+    lap = _lap(timings, "hash", lap)
+    if cached is not None:
+        result["items"] = [dict(det) for det in cached]
+        _lap(timings, "total", started)
+        return result
 
     # --- 3. Define 8 slot regions (2 rows x 4 cols) ---
     rows, cols = 2, 4
@@ -45,130 +149,95 @@ def find_items_in_image(
             sy = row * (cell_h + 0)
             slots.append((sx, sy, cell_w, cell_h))
 
-    slots = slots[:4]   # ✅ Only check the first 4 slots for speed
-
-    # --- 4. Load templates (with transparency) ---
-    templates = []
-    for file in os.listdir(templates_folder):
-        if not file.lower().endswith(".png"):
-            continue
-        tpl_rgba = cv2.imread(os.path.join(templates_folder, file), cv2.IMREAD_UNCHANGED)
-        if tpl_rgba is None:
-            continue
-
-        # Handle missing alpha
-        if tpl_rgba.shape[2] == 4:
-            bgr = tpl_rgba[..., :3]
-            alpha = tpl_rgba[..., 3]
-        else:
-            bgr = tpl_rgba
-            alpha = np.ones(bgr.shape[:2], dtype=np.uint8) * 255
-
-        templates.append((file.replace(".png", "").replace("_", " ").title(), bgr, alpha))
-
-    os.makedirs(debug_output, exist_ok=True)
-    annotated = loot_gui.copy()
-    detections = []
+    # --- 4. Preprocessed templates (loaded once per process, fetched above) ---
+    sink = get_debug_sink()
 
-    # --- 5. For each slot, run detection ---
-    for i, (sx, sy, sw, sh) in enumerate(slots):
+    # --- 5. Normalize every slot and classify empty ones up front ---
+    slot_imgs = []
+    for sx, sy, sw, sh in slots:
         # Extract inner 70x70 area (centered, remove border)
         inner_w, inner_h = 70, 70
         x_pad = (sw - inner_w) // 2
         y_pad = (sh - inner_h) // 2
         slot_crop = loot_gui[sy + y_pad : sy + y_pad + inner_h,
                              sx + x_pad : sx + x_pad + inner_w]
-
         # Downscale slot to 40x40 (match sprite size)
-        slot_img = cv2.resize(slot_crop, (40, 40), interpolation=cv2.INTER_AREA)
-
-        best_item, best_val = None, 0.0
-
-        # --- Loop through templates ---
-        for item_name, bgr, alpha in templates:
-            # --- Ensure both are 40x40 (from earlier safety block) ---
-            if bgr.shape[:2] != (40, 40):
-                bgr = cv2.resize(bgr, (40, 40), interpolation=cv2.INTER_AREA)
-            if alpha.shape[:2] != (40, 40):
-                alpha = cv2.resize(alpha, (40, 40), interpolation=cv2.INTER_NEAREST)
-
-            crop_h = int(40 * (2/3))  # ≈ 26–27 pixels
-            slot_crop_top = slot_img[:crop_h, :, :]
-            tpl_crop_top  = bgr[:crop_h, :, :]
-            mask_crop_top = alpha[:crop_h, :]
-
-            # --- Structural similarity (template match on top 2/3) ---
-            slot_blur = cv2.GaussianBlur(slot_crop_top, (3,3), 0.6)
-            tpl_blur  = cv2.GaussianBlur(tpl_crop_top, (3,3), 0.6)
-
-            # --- Before doing matchTemplate() ---
-            # Check variance of the slot — if it's basically flat gray, skip it
-            slot_var = np.var(slot_img)
-            if slot_var < 5:  # tweak threshold (typical empty gray variance ≈ 0–2)
-                print(f"[DEBUG] Slot {i}: Empty or flat background detected (variance={slot_var:.3f}) — skipping.")
-                break
-
-            res = cv2.matchTemplate(slot_blur, tpl_blur, cv2.TM_CCOEFF_NORMED, mask=mask_crop_top)
-            _, structural_val, _, _ = cv2.minMaxLoc(res)
-
-            # --- Color similarity weighting (HSV hue on top 2/3 only) ---
-            slot_hsv = cv2.cvtColor(slot_crop_top, cv2.COLOR_BGR2HSV)
-            tpl_hsv  = cv2.cvtColor(tpl_crop_top,  cv2.COLOR_BGR2HSV)
-
-            mask_bool = mask_crop_top > 10
-            slot_hue = slot_hsv[..., 0][mask_bool]
-            tpl_hue  = tpl_hsv[..., 0][mask_bool]
-
-            if len(slot_hue) and len(tpl_hue):
-                hue_diff = np.mean(np.abs(slot_hue.astype(np.float32) - tpl_hue.astype(np.float32)))
-                hue_diff = np.minimum(hue_diff, 180 - hue_diff)  # handle wraparound (OpenCV hue 0–180)
-                color_score = 1.0 - min(hue_diff / 90.0, 1.0)
-            else:
-                color_score = 0.5  # neutral fallback
-
-            # --- Combine structure + color weighting ---
-            final_val = 0.9 * structural_val + 0.1 * color_score
-
-            # --- Update best match if higher confidence ---
-            if final_val > best_val:
-                best_val = final_val
-                best_item = item_name
-
+        slot_imgs.append(cv2.resize(slot_crop, (40, 40), interpolation=cv2.INTER_AREA))
+
+    best = [(None, 0.0)] * len(slots)
+    to_match = []
+    for i, slot_img in enumerate(slot_imgs):
+        # If the slot is basically flat gray it is empty (typical variance ≈ 0–2)
+        slot_var = np.var(slot_img)
+        if slot_var < EMPTY_SLOT_VARIANCE:
+            sink.log(f"[DEBUG] Slot {i+1}: Empty or flat background detected (variance={slot_var:.3f}) — skipping.")
+            continue
+        slot_key = (bank.signature, threshold, slot_digest(slot_img))
+        cached = _slot_results.get(slot_key)
+        if cached is not None:
+            result["slot_cache"]["hits"] += 1
+            best[i] = cached
+        else:
+            result["slot_cache"]["misses"] += 1
+            to_match.append((i, slot_key))
+    lap = _lap(timings, "slots", lap)
+
+    # --- 6. Score the remaining slots in one batch (see utils.matcher) ---
+    if to_match:
+        batch = np.stack([slot_imgs[i] for i, _ in to_match])
+        for (i, slot_key), candidates in zip(to_match, top_matches(batch, bank, top_k=1, threshold=threshold)):
+            best[i] = candidates[0] if candidates else (None, 0.0)
+            _slot_results.put(slot_key, best[i])
+    _lap(timings, "match", lap)
 
+    detections = []
+    best_scores = [val for _, val in best]
+    for i, (best_item, best_val) in enumerate(best):
         # --- Record if above threshold ---
         if best_item and best_val >= threshold:
+            entry = bank.index[best_item]
             detections.append({
                 "slot": i + 1,
                 "item": best_item,
+                "key": bank.keys[entry],
+                "shiny": bool(bank.shiny[entry]),
                 "confidence": float(best_val)
             })
-            print(f"[DEBUG] Slot {i+1}: {best_item:30s} | Confidence: {best_val:.3f}")
-
-            # Draw rectangle on annotated image
-            cv2.rectangle(annotated, (sx, sy), (sx+sw, sy+sh), (0, 0, 255), 2)
-            cv2.putText(annotated, f"{best_item} ({best_val:.2f})",
-                        (sx+2, sy+15), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1)
-        else:
-            print(f"[DEBUG] Slot {i+1}: No confident match (best={best_val:.3f})")
-
-    save_slot_debug_image(loot_gui, slots)
-
-
-    # --- 6. Save annotated debug image ---
-    debug_path = os.path.join(debug_output, os.path.basename(screenshot_path))
-    cv2.imwrite(debug_path, annotated)
-    print(f"🖼️ Saved debug annotated image: {debug_path}")
-
-    return detections
+            sink.log(f"[DEBUG] Slot {i+1}: {best_item:30s} | Confidence: {best_val:.3f}")
+        elif best_item:
+            sink.log(f"[DEBUG] Slot {i+1}: No confident match (best={best_val:.3f})")
+
+    # --- 7. Debug artifacts (sampled, written in the background) ---
+    if sink.should_capture(best_scores, threshold):
+        sink.submit({
+            os.path.join(CROPPED_FOLDER, name): loot_gui,
+            os.path.join(debug_output, name): annotate_detections(loot_gui, slots, detections),
+            os.path.join(SLOTS_FOLDER, name): slot_debug_image(loot_gui, slots),
+        })
+
+    _gui_results.put(cache_key, [dict(det) for det in detections])
+    result["items"] = detections
+    _lap(timings, "total", started)
+    return result
+
+
+# --- Debug images (only drawn when the debug sink samples a request) ---
+def annotate_detections(loot_gui, slots, detections):
+    """Cropped loot GUI with each detected item boxed and labelled."""
+    annotated = loot_gui.copy()
+    for det in detections:
+        sx, sy, sw, sh = slots[det["slot"] - 1]
+        cv2.rectangle(annotated, (sx, sy), (sx+sw, sy+sh), (0, 0, 255), 2)
+        cv2.putText(annotated, f"{det['item']} ({det['confidence']:.2f})",
+                    (sx+2, sy+15), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1)
+    return annotated
 
 
-# --- Save a debug image showing 40x40 match boxes ---
-def save_slot_debug_image(loot_gui, slots, output_path="./debug_slots/"):
+def slot_debug_image(loot_gui, slots):
     """
-    Saves the cropped loot GUI with red 70x70 bounding boxes
+    Cropped loot GUI with red 70x70 bounding boxes
     showing the exact areas used for template matching.
     """
-    os.makedirs(output_path, exist_ok=True)
     debug_img = loot_gui.copy()
 
     for (sx, sy, sw, sh) in slots:
@@ -182,7 +251,4 @@ def save_slot_debug_image(loot_gui, slots, output_path="./debug_slots/"):
         # draw red rectangle for the 70x70 match area
         cv2.rectangle(debug_img, (x1, y1), (x2, y2), (0, 0, 255), 2)
 
-    out_path = os.path.join(output_path, "loot_gui_slots_debug.png")
-    cv2.imwrite(out_path, debug_img)
-    print(f"🖼️ Saved slot debug overlay: {out_path}")
-
+    return debug_img
@@ -0,0 +1,174 @@
+import threading
+
+import cv2
+import numpy as np
+
+# --- Reference layout, measured on a 1920x1080 screenshot ---
+REFERENCE_SIZE = (1920, 1080)
+REFERENCE_BOX = (1575, 908, 1905, 1072)   # loot GUI crop used by find_items
+REFERENCE_GRID = (1576, 909)              # top-left of the first slot's outer border
+
+SLOT_SIZE = 79      # outer border to outer border
+SLOT_GAP = 4
+BORDER = 4          # each of the outer (light) and inner (dark) frame lines
+GRID_ROWS, GRID_COLS = 2, 4
+
+# Gray levels of the slot frame in the stock UI
+GAP_GRAY, OUTER_GRAY, INNER_GRAY = 54, 97, 64
+
+ACCEPT_SCORE = 0.45  # stop searching at the first scale this good
+MIN_SCORE = 0.3      # below this the grid is considered not found
+
+
+def _reference_template():
+    """Gray 2x4 slot-frame template at scale 1, plus a mask of frame pixels."""
+    grid_w = GRID_COLS * SLOT_SIZE + (GRID_COLS - 1) * SLOT_GAP
+    grid_h = GRID_ROWS * SLOT_SIZE + (GRID_ROWS - 1) * SLOT_GAP
+    tpl = np.full((grid_h, grid_w), GAP_GRAY, np.uint8)
+    mask = np.full((grid_h, grid_w), 255, np.uint8)
+
+    for row in range(GRID_ROWS):
+        for col in range(GRID_COLS):
+            x = col * (SLOT_SIZE + SLOT_GAP)
+            y = row * (SLOT_SIZE + SLOT_GAP)
+            tpl[y:y + SLOT_SIZE, x:x + SLOT_SIZE] = OUTER_GRAY
+            tpl[y + BORDER:y + SLOT_SIZE - BORDER, x + BORDER:x + SLOT_SIZE - BORDER] = INNER_GRAY
+            # Slot contents vary (items, tinted backgrounds) — only match the frame
+            inner = 2 * BORDER
+            mask[y + inner:y + SLOT_SIZE - inner, x + inner:x + SLOT_SIZE - inner] = 0
+    return tpl, mask
+
+_REF_TEMPLATE, _REF_MASK = _reference_template()
+_scaled_templates = {}
+
+
+def _template_at(scale):
+    key = round(scale, 3)
+    if key not in _scaled_templates:
+        h, w = _REF_TEMPLATE.shape
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        _scaled_templates[key] = (
+            cv2.resize(_REF_TEMPLATE, size, interpolation=cv2.INTER_NEAREST),
+            cv2.resize(_REF_MASK, size, interpolation=cv2.INTER_NEAREST),
+        )
+    return _scaled_templates[key]
+
+
+def _clamp_box(box, img_w, img_h):
+    x0, y0, x1, y1 = box
+    return (
+        min(max(x0, 0), img_w), min(max(y0, 0), img_h),
+        min(max(x1, 0), img_w), min(max(y1, 0), img_h),
+    )
+
+
+def _box_for(grid_x, grid_y, scale):
+    """Map a located grid origin back to a loot GUI crop box."""
+    bx0, by0, bx1, by1 = REFERENCE_BOX
+    gx, gy = REFERENCE_GRID
+    return (
+        round(grid_x + (bx0 - gx) * scale),
+        round(grid_y + (by0 - gy) * scale),
+        round(grid_x + (bx1 - gx) * scale),
+        round(grid_y + (by1 - gy) * scale),
+    )
+
+
+def _fallback_box(img_w, img_h):
+    """Reference box scaled to the image height and anchored bottom-right."""
+    ref_w, ref_h = REFERENCE_SIZE
+    scale = img_h / ref_h
+    bx0, by0, bx1, by1 = REFERENCE_BOX
+    return (
+        round(img_w - (ref_w - bx0) * scale),
+        round(img_h - (ref_h - by0) * scale),
+        round(img_w - (ref_w - bx1) * scale),
+        round(img_h - (ref_h - by1) * scale),
+    )
+
+
+def _candidate_scales(img_w, img_h):
+    """Likely UI scales first, then a coarse sweep."""
+    ref_w, ref_h = REFERENCE_SIZE
+    scales = [img_h / ref_h, img_w / ref_w]
+    scales += [s / 20 for s in range(10, 41)]   # 0.50 – 2.00
+    seen, ordered = set(), []
+    for s in scales:
+        key = round(s, 3)
+        if key not in seen:
+            seen.add(key)
+            ordered.append(s)
+    return ordered
+
+
+def _match_at_scale(gray, scale):
+    """Best (score, grid_x, grid_y) for the slot grid at one scale, searched in the bottom-right."""
+    img_h, img_w = gray.shape
+    tpl, mask = _template_at(scale)
+    th, tw = tpl.shape
+    if th >= img_h or tw >= img_w:
+        return -1.0, 0, 0
+
+    # The loot GUI lives in the bottom-right of the sidebar; search only there
+    x_start = max(0, img_w - round(tw * 1.6))
+    y_start = max(0, img_h - round(th * 2.2))
+    region = gray[y_start:, x_start:]
+
+    res = cv2.matchTemplate(region, tpl, cv2.TM_CCOEFF_NORMED, mask=mask)
+    res = np.nan_to_num(res, nan=-1.0, posinf=-1.0, neginf=-1.0)
+    _, score, _, loc = cv2.minMaxLoc(res)
+    return score, x_start + loc[0], y_start + loc[1]
+
+
+def _score_at(gray, grid_x, grid_y, scale):
+    """Correlation of the grid template at one exact position (cache check)."""
+    tpl, mask = _template_at(scale)
+    th, tw = tpl.shape
+    patch = gray[grid_y:grid_y + th, grid_x:grid_x + tw]
+    if patch.shape != tpl.shape:
+        return -1.0
+    res = cv2.matchTemplate(patch, tpl, cv2.TM_CCOEFF_NORMED, mask=mask)
+    return float(np.nan_to_num(res[0, 0], nan=-1.0))
+
+
+# -------------------------------------------------------------------------
+# Per-resolution layout cache
+# -------------------------------------------------------------------------
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+def locate_loot_gui(img):
+    """
+    Find the 2x4 loot bag grid in a screenshot of any resolution.
+
+    Returns (x0, y0, x1, y1) of the loot GUI crop, equivalent to
+    REFERENCE_BOX at 1920x1080. Layouts are cached per resolution and only
+    re-searched when the cached position no longer lines up.
+    """
+    img_h, img_w = img.shape[:2]
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    with _layouts_lock:
+        cached = _layouts.get((img_w, img_h))
+    if cached is not None:
+        grid_x, grid_y, scale = cached
+        if _score_at(gray, grid_x, grid_y, scale) >= MIN_SCORE:
+            return _clamp_box(_box_for(grid_x, grid_y, scale), img_w, img_h)
+
+    best = (-1.0, 0, 0, 1.0)
+    for scale in _candidate_scales(img_w, img_h):
+        score, grid_x, grid_y = _match_at_scale(gray, scale)
+        if score > best[0]:
+            best = (score, grid_x, grid_y, scale)
+        if score >= ACCEPT_SCORE:
+            break
+
+    score, grid_x, grid_y, scale = best
+    if score < MIN_SCORE:
+        print(f"⚠️ Loot GUI not found (best={score:.3f}); using default layout for {img_w}x{img_h}")
+        return _clamp_box(_fallback_box(img_w, img_h), img_w, img_h)
+
+    with _layouts_lock:
+        _layouts[(img_w, img_h)] = (grid_x, grid_y, scale)
+    return _clamp_box(_box_for(grid_x, grid_y, scale), img_w, img_h)
@@ -0,0 +1,21 @@
+import cv2
+import numpy as np
+
+GUI_HASH_SIZE = 16     # 256-bit hash of the normalized loot GUI crop
+FRAME_HASH_SIZE = 8    # 64-bit hash of the whole screenshot
+
+
+def dhash(img, size=8):
+    """
+    Difference hash: shrink to (size+1) x size grayscale and record whether
+    each pixel is brighter than its right neighbour. Survives re-encoding
+    and rescaling; returns a size*size-bit int.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
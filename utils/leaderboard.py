@@ -0,0 +1,87 @@
+from bisect import bisect_left, insort
+
+from utils.player_records import load_player_records
+
+LEADERBOARD_PAGE_SIZE = 20
+
+
+def _best_entry(key, player_data):
+    """Sort key for a player's best PPE: highest points first, then name."""
+    ppes = player_data.get("ppes", [])
+    if not ppes:
+        return None
+    best_ppe = max(ppes, key=lambda p: p["points"])
+    return (-best_ppe["points"], key, best_ppe["id"])
+
+
+class LeaderboardIndex:
+    """
+    One guild's ranking of players by their best PPE, kept sorted so
+    top-N / rank lookups never scan. Finding an entry is an O(log n)
+    bisect, but inserting or removing it in the list is O(n) (the tail
+    is shifted) — a memmove of a few hundred pointers at contest sizes.
+    """
+
+    def __init__(self, records):
+        self._best = {}
+        for key, data in records.items():
+            entry = _best_entry(key, data)
+            if entry is not None:
+                self._best[key] = entry
+        self._entries = sorted(self._best.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def remove(self, key):
+        entry = self._best.pop(key, None)
+        if entry is not None:
+            del self._entries[bisect_left(self._entries, entry)]
+
+    def update(self, key, player_data):
+        entry = _best_entry(key, player_data)
+        if entry == self._best.get(key):
+            return
+        self.remove(key)
+        if entry is not None:
+            self._best[key] = entry
+            insort(self._entries, entry)
+
+    def page(self, offset=0, limit=LEADERBOARD_PAGE_SIZE):
+        """[(rank, player, ppe_id, points)] for ranks offset+1 .. offset+limit."""
+        return [
+            (offset + i + 1, key, ppe_id, -neg_points)
+            for i, (neg_points, key, ppe_id) in enumerate(self._entries[offset:offset + limit])
+        ]
+
+    def rank(self, key):
+        """(rank, ppe_id, points) for one player, or None if unranked."""
+        entry = self._best.get(key)
+        if entry is None:
+            return None
+        return bisect_left(self._entries, entry) + 1, entry[2], -entry[0]
+
+
+# -------------------------------------------------------------------------
+# Per-guild indexes, built on first use
+# -------------------------------------------------------------------------
+
+_indexes = {}
+
+async def get_leaderboard(guild_id: int) -> LeaderboardIndex:
+    index = _indexes.get(guild_id)
+    if index is None:
+        index = LeaderboardIndex(await load_player_records(guild_id))
+        _indexes[guild_id] = index
+    return index
+
+def update_player(guild_id: int, key: str, player_data: dict):
+    """Call after a player's PPEs or points change. No-op until the index is built."""
+    index = _indexes.get(guild_id)
+    if index is not None:
+        index.update(key, player_data)
+
+def remove_player(guild_id: int, key: str):
+    index = _indexes.get(guild_id)
+    if index is not None:
+        index.remove(key)
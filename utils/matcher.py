@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+
+from utils.template_bank import (
+    CROP_H, THUMBNAIL_SIZE, circular_mean_hue, hue_histogram,
+)
+
+STRUCTURE_WEIGHT = 0.9
+COLOR_WEIGHT = 0.1
+
+# Coarse stage keeps this many templates per slot for full scoring
+PRUNE_CANDIDATES = 32
+SLOT_SATURATION_MIN = 25  # slot pixels below this saturation count as background for hue stats
+
+
+def prepare_slots(slot_imgs):
+    """
+    Turn (S, 40, 40, 3) BGR slot images into the flattened inputs the
+    batch scorer needs: blurred top 2/3 pixels and their HSV.
+    """
+    blurred, hsvs = [], []
+    for slot_img in slot_imgs:
+        slot_crop_top = slot_img[:CROP_H, :, :]
+        blurred.append(cv2.GaussianBlur(slot_crop_top, (3,3), 0.6))
+        hsvs.append(cv2.cvtColor(slot_crop_top, cv2.COLOR_BGR2HSV))
+    return np.stack(blurred), np.stack(hsvs)
+
+
+# -------------------------------------------------------------------------
+# Stage 1: coarse scores from the pruning index
+# -------------------------------------------------------------------------
+
+def coarse_scores(blurred, hsvs, bank):
+    """
+    Cheap (S, N) similarity from 8x8 thumbnails and hue histograms.
+    Only used to rank candidates; never reported as a confidence.
+    """
+    size = (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+    s = len(blurred)
+
+    thumbs = np.stack([
+        cv2.resize(b.astype(np.float32), size, interpolation=cv2.INTER_AREA)
+        for b in blurred
+    ]).reshape(s, -1, 3)
+    thumbs -= thumbs.mean(axis=1, keepdims=True)
+
+    # Masked correlation of the thumbnails (same form as the full matcher)
+    numerator = thumbs.reshape(s, -1) @ bank.thumbnail.T                    # (S, N)
+    thumb_sum = bank.thumbnail_mask[None] @ thumbs                          # (S, N, 3)
+    thumb_sq = bank.thumbnail_mask[None] @ (thumbs * thumbs)
+    thumb_var = thumb_sq - thumb_sum * thumb_sum / bank.thumbnail_count[None, :, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        structural = numerator / np.sqrt(np.maximum(thumb_var.sum(axis=2), 1e-6))
+
+    # Colour: histogram overlap and mean-hue distance on the slot's coloured pixels
+    color = np.full(structural.shape, 0.5, np.float32)
+    for i, hsv in enumerate(hsvs):
+        hues = hsv[..., 0][hsv[..., 1] >= SLOT_SATURATION_MIN]
+        if not len(hues):
+            continue
+        overlap = np.minimum(bank.hue_hist, hue_histogram(hues)[None]).sum(axis=1)
+        mean_diff = np.abs(bank.mean_hue - circular_mean_hue(hues))
+        mean_diff = np.minimum(mean_diff, 180 - mean_diff)
+        color[i] = 0.5 * overlap + 0.5 * (1.0 - mean_diff / 90.0)
+
+    return np.nan_to_num(STRUCTURE_WEIGHT * structural + COLOR_WEIGHT * color, nan=-1.0)
+
+
+# -------------------------------------------------------------------------
+# Stage 2: exact scores
+# -------------------------------------------------------------------------
+
+def _full_scores(blurred, hsvs, bank, idx=None):
+    """
+    Exact blended score of each slot against the templates in idx
+    (all templates if idx is None). Returns (S, len(idx)).
+    """
+    if idx is None:
+        idx = slice(None)
+
+    centered = bank.centered[idx]
+    centered_norm = bank.centered_norm[idx]
+    match_mask = bank.match_mask[idx]
+    match_count = bank.match_count[idx]
+    hue_flat = bank.hue_flat[idx]
+    hue_mask = bank.hue_mask[idx]
+    hue_count = bank.hue_count[idx]
+
+    s = len(blurred)
+    pixels = blurred.shape[1] * blurred.shape[2]
+    slots = blurred.reshape(s, pixels, 3).astype(np.float32)
+    hues = hsvs[..., 0].reshape(s, pixels).astype(np.float32)
+
+    # --- Structural similarity: masked TM_CCOEFF_NORMED for all templates ---
+    # Correlation is invariant to a per-channel offset, so center each slot
+    # first to keep float32 sums well conditioned.
+    slots -= slots.mean(axis=1, keepdims=True)
+
+    numerator = slots.reshape(s, pixels * 3) @ centered.T                   # (S, N)
+    slot_sum = match_mask[None] @ slots                                     # (S, N, 3)
+    slot_sq = match_mask[None] @ (slots * slots)                            # (S, N, 3)
+    slot_var = slot_sq - slot_sum * slot_sum / np.maximum(match_count, 1)[None, :, None]
+    slot_norm = np.sqrt(np.maximum(slot_var.sum(axis=2), 0))                # (S, N)
+
+    denominator = slot_norm * centered_norm[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        structural = np.where(denominator > 1e-6, numerator / denominator, np.nan)
+
+    # --- Color similarity weighting (HSV hue on top 2/3 only) ---
+    hue_abs = np.abs(hues[:, None, :] - hue_flat[None, :, :])               # (S, N, P)
+    hue_diff = (hue_abs * hue_mask[None]).sum(axis=2) / np.maximum(hue_count, 1)[None, :]
+    hue_diff = np.minimum(hue_diff, 180 - hue_diff)  # handle wraparound (OpenCV hue 0–180)
+    color_score = 1.0 - np.minimum(hue_diff / 90.0, 1.0)
+    color_score = np.where(hue_count[None, :] > 0, color_score, 0.5)  # neutral fallback
+
+    # --- Combine structure + color weighting ---
+    final = STRUCTURE_WEIGHT * structural + COLOR_WEIGHT * color_score
+    return np.nan_to_num(final, nan=-1.0).astype(np.float32)
+
+
+def _top_k(names, scores, idx, k):
+    # Identical sprites saved under two names tie exactly; break ties by
+    # bank order (ignoring float noise) so pruned and full runs agree.
+    order = np.lexsort((idx, -np.round(scores, 6)))[:k]
+    return [(names[idx[j]], float(scores[j])) for j in order]
+
+
+def top_matches(slot_imgs, bank, top_k=5, prune=PRUNE_CANDIDATES, threshold=None):
+    """
+    Return, for each slot, its top_k (item_name, score) candidates,
+    best first.
+
+    With prune set, a coarse pass first narrows each slot to `prune`
+    templates and only those get the exact score. If a threshold is given
+    and the best pruned score misses it, that slot is rescored against the
+    whole bank, so pruning can never turn a detection into a miss.
+    """
+    n = len(bank)
+    if n == 0:
+        return [[] for _ in slot_imgs]
+
+    blurred, hsvs = prepare_slots(slot_imgs)
+    everything = np.arange(n)
+
+    if not prune or n <= prune:
+        scores = _full_scores(blurred, hsvs, bank)
+        return [_top_k(bank.names, row, everything, top_k) for row in scores]
+
+    coarse = coarse_scores(blurred, hsvs, bank)
+    results = []
+    for i in range(len(blurred)):
+        idx = np.argpartition(-coarse[i], prune - 1)[:prune]
+        scores = _full_scores(blurred[i:i + 1], hsvs[i:i + 1], bank, idx)[0]
+        if threshold is not None and scores.max() < threshold:
+            idx = everything
+            scores = _full_scores(blurred[i:i + 1], hsvs[i:i + 1], bank)[0]
+        results.append(_top_k(bank.names, scores, idx, top_k))
+    return results
@@ -0,0 +1,200 @@
+import asyncio
+import bisect
+import os
+import time
+from contextlib import contextmanager
+
+# Prometheus text endpoint on 127.0.0.1:METRICS_PORT (unset = disabled)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Latency bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+LOOP_LAG_INTERVAL = 0.5   # seconds between event-loop lag probes
+
+# Loot pipeline stages, in the order a screenshot passes through them.
+# decode/locate/hash/slots/match are measured inside the detection workers.
+# repost_record stores the screenshot hashes; record_save is the background flush.
+LOOT_STAGES = (
+    "download", "queue_wait", "decode", "locate", "hash", "slots", "match",
+    "detect", "repost_check", "scoring", "repost_record", "record_save", "reply",
+)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus style), in milliseconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= target:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (target - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+# --- Registry (event-loop process only; workers report through results) ---
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> Histogram
+_gauges = {}       # name -> callable returning a number
+_started = time.time()
+_lag_task = None
+_server = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, ms, **labels):
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = Histogram()
+    hist.observe(ms)
+
+def observe_stage(stage, ms):
+    observe("loot_stage_ms", ms, stage=stage)
+
+def gauge(name, fn):
+    """Register a gauge sampled when metrics are read."""
+    _gauges[name] = fn
+
+@contextmanager
+def timed(stage):
+    """Time a block of the loot pipeline (works inside async functions too)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, (time.perf_counter() - started) * 1000)
+
+
+def counter_value(name, **labels):
+    return _counters.get(_key(name, labels), 0)
+
+def stage_histogram(stage):
+    return _histograms.get(_key("loot_stage_ms", {"stage": stage}))
+
+def histogram(name, **labels):
+    return _histograms.get(_key(name, labels))
+
+def gauge_values():
+    values = {}
+    for name, fn in _gauges.items():
+        try:
+            values[name] = float(fn())
+        except Exception:
+            continue
+    return values
+
+def uptime():
+    return time.time() - _started
+
+
+# --- Event-loop lag ---
+async def _probe_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        observe("event_loop_lag_ms", max(0.0, loop.time() - expected) * 1000)
+
+
+# --- Prometheus text format ---
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    lines = []
+    for name in sorted({n for n, _ in _counters}):
+        lines.append(f"# TYPE ppebot_{name} counter")
+        for (n, labels), value in sorted(_counters.items()):
+            if n == name:
+                lines.append(f"ppebot_{name}{_labels(labels)} {value}")
+    for name in sorted({n for n, _ in _histograms}):
+        lines.append(f"# TYPE ppebot_{name} histogram")
+        for (n, labels), hist in sorted(_histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                cumulative += count
+                lines.append(f"ppebot_{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"ppebot_{name}_sum{_labels(labels)} {hist.sum:.3f}")
+            lines.append(f"ppebot_{name}_count{_labels(labels)} {hist.count}")
+    for name, value in sorted(gauge_values().items()):
+        lines.append(f"# TYPE ppebot_{name} gauge")
+        lines.append(f"ppebot_{name} {value:g}")
+    lines.append("# TYPE ppebot_uptime_seconds gauge")
+    lines.append(f"ppebot_uptime_seconds {uptime():.0f}")
+    return "\n".join(lines) + "\n"
+
+async def _serve_metrics(reader, writer):
+    try:
+        # Any request gets the metrics page; read (and ignore) the request head
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        body = render_prometheus().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics(port=METRICS_PORT, host=METRICS_HOST):
+    """Start the event-loop lag probe and, if a port is set, the /metrics endpoint."""
+    global _lag_task, _server
+    if _lag_task is None:
+        _lag_task = asyncio.create_task(_probe_loop_lag())
+    if port and _server is None:
+        try:
+            _server = await asyncio.start_server(_serve_metrics, host, port)
+            print(f"📈 Metrics available at http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Could not start metrics endpoint on {host}:{port}: {e}")
+
+async def stop_metrics():
+    global _lag_task, _server
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,109 @@
+import discord
+
+LIST_PAGE_SIZE = 20
+PAGE_TIMEOUT = 180          # seconds before the buttons stop responding
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_COLOR = discord.Color.gold()
+
+# (cache_key, page) -> (version, description). Entries go stale as soon as
+# the caller's version moves on, so a mutation invalidates every page.
+_page_cache = {}
+
+
+def page_count(total, per_page):
+    return max(1, -(-total // per_page))
+
+
+def _fit(lines):
+    """Join page lines, cutting at a line boundary if the embed limit is hit."""
+    text = ""
+    for line in lines:
+        candidate = f"{text}\n{line}" if text else line
+        if len(candidate) > EMBED_DESCRIPTION_LIMIT - 2:
+            return text + "\n…"
+        text = candidate
+    return text
+
+
+class PaginatorView(discord.ui.View):
+    """
+    Prev/next buttons over an embed whose pages are rendered on demand.
+
+    `render(page)` returns the lines for one 0-based page. With a
+    `cache_key` and `version`, rendered pages are reused until the
+    version changes.
+    """
+
+    def __init__(self, title, pages, render, author_id, page=0,
+                 cache_key=None, version=None, footer=None):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.title = title
+        self.pages = max(1, pages)
+        self.render = render
+        self.author_id = author_id
+        self.page = min(max(page, 0), self.pages - 1)
+        self.cache_key = cache_key
+        self.version = version
+        self.footer = footer
+        self.message = None
+        self._sync_buttons()
+
+    def _description(self):
+        if self.cache_key is None:
+            return _fit(self.render(self.page))
+        cached = _page_cache.get((self.cache_key, self.page))
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        text = _fit(self.render(self.page))
+        _page_cache[(self.cache_key, self.page)] = (self.version, text)
+        return text
+
+    def embed(self):
+        embed = discord.Embed(title=self.title, description=self._description(), color=EMBED_COLOR)
+        footer = f"Page {self.page + 1}/{self.pages}" if self.pages > 1 else ""
+        if self.footer:
+            footer = f"{footer} · {self.footer}" if footer else self.footer
+        if footer:
+            embed.set_footer(text=footer)
+        return embed
+
+    def _sync_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def send(self, interaction: discord.Interaction):
+        if self.pages == 1:
+            return await interaction.response.send_message(embed=self.embed())
+        await interaction.response.send_message(embed=self.embed(), view=self)
+        self.message = await interaction.original_response()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("🚫 Only the person who ran this command can turn pages.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, page):
+        self.page = page
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+def list_pages(lines, per_page):
+    """(pages, render) for an already-built list of lines."""
+    return page_count(len(lines), per_page), lambda page: lines[page * per_page:(page + 1) * per_page]
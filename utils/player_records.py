@@ -1,6 +1,11 @@
 import os
-import json
+import copy
 import asyncio
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager
+
+from utils import metrics
+from utils.record_store import count_items, load_guild_records, save_guild_records
 
 # Directory to store per-guild player data
 DATA_DIR = "./data"
@@ -16,33 +21,210 @@ def get_lock(guild_id: int):
     return _locks[guild_id]
 
 def get_guild_data_path(guild_id: int) -> str:
-    """Return the file path for this guild's data file."""
+    """Return the legacy JSON file path for this guild (pre-SQLite data)."""
     return os.path.join(DATA_DIR, f"{guild_id}_loot_records.json")
 
 
+# -------------------------------------------------------------------------
+# In-memory record cache (write-behind)
+# -------------------------------------------------------------------------
+#
+# The cache is the source of truth while the bot runs. Mutations swap in a
+# new dict per guild (copy-on-write, per player) and mark the changed
+# players dirty; a background task writes them to the database every
+# FLUSH_INTERVAL_MS, or sooner once FLUSH_MAX_CHANGES mutations are
+# pending, and once more on shutdown.
+
+FLUSH_INTERVAL_MS = int(os.getenv("RECORDS_FLUSH_MS", "2000"))
+FLUSH_MAX_CHANGES = int(os.getenv("RECORDS_FLUSH_MAX_CHANGES", "50"))
+
+_cache = {}         # guild_id -> records dict (never mutated once cached)
+_dirty = {}         # guild_id -> player keys changed since the last flush
+_versions = {}      # guild_id -> bumped on every mutation (for render caches)
+_pending = 0
+_flush_now = None   # asyncio.Event, set when _pending reaches FLUSH_MAX_CHANGES
+_flush_lock = asyncio.Lock()
+_flusher = None
+
+async def _cached(guild_id: int) -> dict:
+    records = _cache.get(guild_id)
+    if records is None:
+        records = await load_guild_records(guild_id)
+        _cache[guild_id] = records
+    return records
+
+def _mark_dirty(guild_id: int, records: dict, players):
+    global _pending
+    _cache[guild_id] = records
+    _versions[guild_id] = _versions.get(guild_id, 0) + 1
+    _dirty.setdefault(guild_id, set()).update(players)
+    _pending += 1
+    if _flush_now is not None and _pending >= FLUSH_MAX_CHANGES:
+        _flush_now.set()
+
+def records_version(guild_id: int) -> int:
+    """Changes whenever the guild's records change; use it to invalidate derived data."""
+    return _versions.get(guild_id, 0)
+
+def dirty_guild_count() -> int:
+    """Guilds with changes not yet written to the database."""
+    return len(_dirty)
+
+async def flush_records():
+    """Write every dirty guild to the database. Returns the number of guilds written."""
+    global _pending
+    async with _flush_lock:
+        dirty = dict(_dirty)
+        _dirty.clear()
+        _pending = 0
+        written = 0
+        for guild_id, players in dirty.items():
+            try:
+                with metrics.timed("record_save"):
+                    await save_guild_records(guild_id, _cache[guild_id], players)
+                written += 1
+            except Exception as e:
+                print(f"⚠️ Failed to flush records for guild {guild_id}: {e}")
+                _dirty.setdefault(guild_id, set()).update(players)
+                _pending += 1
+        return written
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), timeout=FLUSH_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        if _dirty:
+            await flush_records()
+
+def start_flusher():
+    """Start the background flush task (call from the running event loop)."""
+    global _flusher, _flush_now
+    if _flusher is None:
+        _flush_now = asyncio.Event()
+        _flusher = asyncio.create_task(_flush_loop())
+
+async def stop_flusher():
+    """Stop the flush task and write anything still pending."""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    await flush_records()
+
+
 # -------------------------------------------------------------------------
 # Core read/write functions
 # -------------------------------------------------------------------------
 
 async def load_player_records(guild_id: int):
-    """Load player records for a specific guild safely."""
-    path = get_guild_data_path(guild_id)
-    if not os.path.exists(path):
-        return {}
-
+    """
+    Return a guild's records straight from memory. The dict is shared:
+    treat it as read-only and make changes through guild_records().
+    """
     async with get_lock(guild_id):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+        return await _cached(guild_id)
 
 async def save_player_records(guild_id: int, records: dict):
-    """Save player records for a specific guild safely."""
-    path = get_guild_data_path(guild_id)
+    """Replace a guild's records; they reach the database on the next flush."""
     async with get_lock(guild_id):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=2)
+        old = await _cached(guild_id)
+        _mark_dirty(guild_id, records, old.keys() | records.keys())
+
+
+class RecordsTransaction(MutableMapping):
+    """
+    The records dict seen inside guild_records(). A player is deep-copied
+    the first time it is looked up, so a transaction costs one copy per
+    player it touches rather than one per guild; players it never reads
+    stay shared with the cached records.
+    """
+
+    def __init__(self, records: dict):
+        self._base = records
+        self._touched = {}      # player key -> private copy
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._touched:
+            return self._touched[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        player = self._touched[key] = copy.deepcopy(self._base[key])
+        return player
+
+    def __setitem__(self, key, value):
+        self._deleted.discard(key)
+        self._touched[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._touched.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._touched or (key in self._base and key not in self._deleted)
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._touched:
+            if key not in self._base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def commit(self):
+        """
+        (new records dict, changed player keys). Touched players equal to
+        their cached version do not count; with no changes the dict is
+        the cached one, unchanged.
+        """
+        changed = {key for key in self._deleted if key in self._base}
+        changed.update(
+            key for key, player in self._touched.items()
+            if self._base.get(key) != player
+        )
+        if not changed:
+            return self._base, changed
+        records = dict(self._base)
+        for key in changed:
+            if key in self._deleted:
+                records.pop(key, None)
+            else:
+                records[key] = self._touched[key]
+        return records, changed
+
+@asynccontextmanager
+async def guild_records(guild_id: int):
+    """
+    Read-modify-write a guild's records as one transaction:
+
+        async with guild_records(guild_id) as records:
+            records[key]["active_ppe"] = 2
+
+    The guild lock is held for the whole block, so concurrent commands and
+    loot posts cannot overwrite each other. The block works on copies of
+    the players it touches (see RecordsTransaction), which replace the
+    cached ones when it exits cleanly; if it raises, nothing changes.
+    Only players that actually changed are marked dirty, and they reach
+    the database on the next flush.
+    """
+    async with get_lock(guild_id):
+        transaction = RecordsTransaction(await _cached(guild_id))
+        yield transaction
+        records, changed = transaction.commit()
+        if changed:
+            _mark_dirty(guild_id, records, changed)
 
 
 # -------------------------------------------------------------------------
@@ -64,3 +246,26 @@ def get_active_ppe(player_data: dict):
             return ppe
     return None
 
+def item_counts(ppe: dict) -> dict:
+    """
+    Copies of each item this PPE has received, keyed by normalized name.
+    Unlike ppe["items"] (which lists an item once) this also counts
+    duplicates. Built from the item list if the PPE has no index yet.
+    """
+    counts = ppe.get("item_counts")
+    if counts is None:
+        counts = ppe["item_counts"] = count_items(ppe.get("items", []))
+    return counts
+
+def add_ppe_item(ppe: dict, item_key: str, listed: bool = True) -> int:
+    """
+    Record one more copy of `item_key` (appending it to the item list if
+    `listed`). Returns which copy this is: 1 for the first, 2 for the
+    first duplicate, and so on.
+    """
+    counts = item_counts(ppe)
+    counts[item_key] = counts.get(item_key, 0) + 1
+    if listed:
+        ppe.setdefault("items", []).append(item_key)
+    return counts[item_key]
+
@@ -0,0 +1,85 @@
+import csv
+import os
+import threading
+import unicodedata
+from types import MappingProxyType
+
+LOOT_POINTS_CSV = "./rotmg_loot_drops_updated.csv"
+
+
+def normalize_item_name(name: str) -> str:
+    """
+    Canonical lookup key for an item name, shared by the detector, the
+    points table and PPE item lists: straight quotes, NFKC, single spaces,
+    lowercase.
+    """
+    if not name:
+        return ""
+    # Convert fancy apostrophes/quotes to straight ones
+    name = name.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    # Normalize Unicode (handles subtle variants)
+    name = unicodedata.normalize("NFKC", name)
+    return " ".join(name.split()).lower()
+
+
+def parse_points_csv(path=LOOT_POINTS_CSV):
+    """Read the loot CSV into {normalized item name: points}. Later rows win."""
+    loot_points = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            loot_points[normalize_item_name(row["Item Name"])] = float(row["Points"])
+    return loot_points
+
+
+# -------------------------------------------------------------------------
+# Process-wide table with mtime-based hot reload
+# -------------------------------------------------------------------------
+
+_table = MappingProxyType({})
+_table_mtime = None
+_reload_lock = threading.Lock()
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def reload_points_table(path=LOOT_POINTS_CSV, force=False):
+    """
+    Re-read the CSV if it changed on disk (or always, with force=True) and
+    swap it in atomically. A file that is missing, half-written or changes
+    while being read leaves the previous table in place.
+    Returns the number of items in the active table.
+    """
+    global _table, _table_mtime
+
+    with _reload_lock:
+        before = _mtime(path)
+        if before is None:
+            print(f"⚠️ Points table {path} not found; keeping {len(_table)} cached items.")
+            return len(_table)
+        if not force and before == _table_mtime:
+            return len(_table)
+
+        try:
+            loot_points = parse_points_csv(path)
+        except (OSError, KeyError, ValueError, csv.Error) as e:
+            print(f"⚠️ Could not parse {path} ({e}); keeping previous points table.")
+            return len(_table)
+
+        if _mtime(path) != before:
+            print(f"⚠️ {path} changed while reading; keeping previous points table.")
+            return len(_table)
+
+        _table = MappingProxyType(loot_points)
+        _table_mtime = before
+        print(f"📊 Loaded {len(loot_points)} item point values from {path}")
+        return len(_table)
+
+def get_points_table(path=LOOT_POINTS_CSV):
+    """Return the current read-only {normalized name: points} table."""
+    if _mtime(path) != _table_mtime:
+        reload_points_table(path)
+    return _table
@@ -0,0 +1,92 @@
+import json
+import os
+
+from utils.atomic_io import write_json_atomic
+
+PPE_CHANNEL_FILE = "./ppe_channels.json"
+
+# guild_id -> set of PPE channel ids, loaded once and kept in memory
+_channels = {}
+
+# Channel ids from the old global list whose guild is not known yet
+_legacy = set()
+
+
+def _save(path=PPE_CHANNEL_FILE):
+    data = {"guilds": {str(gid): sorted(ids) for gid, ids in _channels.items() if ids}}
+    if _legacy:
+        data["ppe_channels"] = sorted(_legacy)
+    write_json_atomic(path, data)
+
+
+def load_ppe_channels(path=PPE_CHANNEL_FILE):
+    """
+    Read the channel registry into memory. Understands both the per-guild
+    format ({"guilds": {guild_id: [channel_ids]}}) and the old global
+    {"ppe_channels": [...]} list, whose entries wait in _legacy until
+    adopt_legacy_channels() can tell which guild they belong to.
+    """
+    _channels.clear()
+    _legacy.clear()
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not read {path} ({e}); starting with no PPE channels.")
+        return 0
+
+    for gid, ids in data.get("guilds", {}).items():
+        _channels[int(gid)] = {int(cid) for cid in ids}
+    _legacy.update(int(cid) for cid in data.get("ppe_channels", []))
+    return sum(len(ids) for ids in _channels.values()) + len(_legacy)
+
+
+def adopt_legacy_channels(get_channel, path=PPE_CHANNEL_FILE):
+    """
+    Assign old global-list channel ids to their guilds. `get_channel` maps a
+    channel id to a channel object (or None), e.g. bot.get_channel.
+    Channels that cannot be resolved stay in the legacy list.
+    """
+    adopted = 0
+    for cid in list(_legacy):
+        channel = get_channel(cid)
+        guild = getattr(channel, "guild", None)
+        if guild is None:
+            continue
+        _channels.setdefault(guild.id, set()).add(cid)
+        _legacy.discard(cid)
+        adopted += 1
+    if adopted:
+        _save(path)
+        print(f"📌 Moved {adopted} PPE channel(s) to the per-guild registry")
+    return adopted
+
+
+def is_ppe_channel(guild_id: int, channel_id: int) -> bool:
+    return channel_id in _channels.get(guild_id, ())
+
+
+def get_ppe_channels(guild_id: int):
+    return sorted(_channels.get(guild_id, ()))
+
+
+def add_ppe_channel(guild_id: int, channel_id: int, path=PPE_CHANNEL_FILE) -> bool:
+    """Register a channel. Returns False if it was already registered."""
+    channels = _channels.setdefault(guild_id, set())
+    if channel_id in channels:
+        return False
+    channels.add(channel_id)
+    _save(path)
+    return True
+
+
+def remove_ppe_channel(guild_id: int, channel_id: int, path=PPE_CHANNEL_FILE) -> bool:
+    """Unregister a channel. Returns False if it was not registered."""
+    channels = _channels.get(guild_id, set())
+    if channel_id not in channels:
+        return False
+    channels.discard(channel_id)
+    _save(path)
+    return True
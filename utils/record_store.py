@@ -0,0 +1,377 @@
+import asyncio
+import copy
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+
+import aiosqlite
+
+from utils.points_table import normalize_item_name
+
+DB_PATH = "./data.db"
+
+# Composite primary keys double as the (guild_id, player_key) lookup indexes.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    guild_id    INTEGER NOT NULL,
+    player_key  TEXT    NOT NULL,
+    active_ppe  INTEGER,
+    is_member   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_key)
+);
+CREATE TABLE IF NOT EXISTS ppes (
+    guild_id    INTEGER NOT NULL,
+    player_key  TEXT    NOT NULL,
+    ppe_id      INTEGER NOT NULL,
+    name        TEXT    NOT NULL,
+    points      REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_key, ppe_id)
+);
+CREATE TABLE IF NOT EXISTS ppe_items (
+    guild_id    INTEGER NOT NULL,
+    player_key  TEXT    NOT NULL,
+    ppe_id      INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    item_name   TEXT    NOT NULL,
+    PRIMARY KEY (guild_id, player_key, ppe_id, position)
+);
+CREATE TABLE IF NOT EXISTS ppe_item_counts (
+    guild_id    INTEGER NOT NULL,
+    player_key  TEXT    NOT NULL,
+    ppe_id      INTEGER NOT NULL,
+    item_key    TEXT    NOT NULL,
+    copies      INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, player_key, ppe_id, item_key)
+);
+CREATE TABLE IF NOT EXISTS screenshot_hashes (
+    guild_id    INTEGER NOT NULL,
+    gui_hash    TEXT    NOT NULL,
+    frame_hash  TEXT    NOT NULL,
+    items       TEXT    NOT NULL,
+    player_key  TEXT    NOT NULL,
+    message_id  INTEGER,
+    created_at  TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS screenshot_hashes_guild ON screenshot_hashes (guild_id, created_at);
+CREATE TABLE IF NOT EXISTS migrations (
+    name        TEXT PRIMARY KEY,
+    applied_at  TEXT NOT NULL
+);
+"""
+
+# One shared connection for the whole bot
+_db = None
+
+# Last persisted state per guild, used to turn a save into row-level changes
+_snapshots = {}
+
+# The flusher, the repost index and the migration share one connection, so
+# a commit or rollback applies to whatever any of them has pending: only one
+# of them may write (or load a snapshot for a save) at a time.
+_write_lock = asyncio.Lock()
+
+
+async def open_store(path=DB_PATH):
+    """Open the shared connection (WAL mode) and create the schema."""
+    global _db
+    if _db is not None:
+        return _db
+    _db = await aiosqlite.connect(path)
+    await _db.execute("PRAGMA journal_mode=WAL")
+    await _db.execute("PRAGMA synchronous=NORMAL")
+    await _db.executescript(SCHEMA)
+    await _db.commit()
+    return _db
+
+async def close_store():
+    global _db
+    if _db is not None:
+        await _db.close()
+        _db = None
+    _snapshots.clear()
+
+async def _conn():
+    return _db if _db is not None else await open_store()
+
+
+# -------------------------------------------------------------------------
+# Load
+# -------------------------------------------------------------------------
+
+def count_items(items) -> dict:
+    """{normalized item name: copies} for an item list."""
+    return dict(Counter(normalize_item_name(i) for i in items))
+
+async def load_guild_records(guild_id: int) -> dict:
+    """Assemble a guild's records in the same dict shape the JSON files used."""
+    db = await _conn()
+    records = {}
+
+    async with db.execute(
+        "SELECT player_key, active_ppe, is_member FROM players WHERE guild_id = ?", (guild_id,)
+    ) as cur:
+        async for key, active_ppe, is_member in cur:
+            records[key] = {"ppes": [], "active_ppe": active_ppe, "is_member": bool(is_member)}
+
+    ppes = {}
+    async with db.execute(
+        "SELECT player_key, ppe_id, name, points FROM ppes WHERE guild_id = ? ORDER BY player_key, ppe_id",
+        (guild_id,),
+    ) as cur:
+        async for key, ppe_id, name, points in cur:
+            if key not in records:
+                continue
+            ppe = {"id": ppe_id, "name": name, "points": points, "items": []}
+            records[key]["ppes"].append(ppe)
+            ppes[(key, ppe_id)] = ppe
+
+    async with db.execute(
+        "SELECT player_key, ppe_id, item_name FROM ppe_items WHERE guild_id = ? ORDER BY player_key, ppe_id, position",
+        (guild_id,),
+    ) as cur:
+        async for key, ppe_id, item_name in cur:
+            ppe = ppes.get((key, ppe_id))
+            if ppe is not None:
+                ppe["items"].append(item_name)
+
+    # Copy counts start from the item lists (so older databases get an index
+    # too); stored counts add the duplicates the lists leave out.
+    for ppe in ppes.values():
+        ppe["item_counts"] = count_items(ppe["items"])
+    async with db.execute(
+        "SELECT player_key, ppe_id, item_key, copies FROM ppe_item_counts WHERE guild_id = ?", (guild_id,)
+    ) as cur:
+        async for key, ppe_id, item_key, copies in cur:
+            ppe = ppes.get((key, ppe_id))
+            if ppe is not None:
+                ppe["item_counts"][item_key] = max(ppe["item_counts"].get(item_key, 0), copies)
+
+    _snapshots[guild_id] = copy.deepcopy(records)
+    return records
+
+
+# -------------------------------------------------------------------------
+# Save (row-level diff against the last persisted state)
+# -------------------------------------------------------------------------
+
+def _player_row(guild_id, key, data):
+    return (guild_id, key, data.get("active_ppe"), int(bool(data.get("is_member", False))))
+
+def _ppe_row(guild_id, key, ppe):
+    return (guild_id, key, ppe["id"], ppe.get("name", f"PPE #{ppe['id']}"), float(ppe.get("points", 0)))
+
+async def _delete_player(db, guild_id, key):
+    for table in ("ppe_items", "ppe_item_counts", "ppes", "players"):
+        await db.execute(f"DELETE FROM {table} WHERE guild_id = ? AND player_key = ?", (guild_id, key))
+
+async def _delete_ppe(db, guild_id, key, ppe_id):
+    for table in ("ppe_items", "ppe_item_counts", "ppes"):
+        await db.execute(
+            f"DELETE FROM {table} WHERE guild_id = ? AND player_key = ? AND ppe_id = ?",
+            (guild_id, key, ppe_id),
+        )
+
+async def _write_items(db, guild_id, key, ppe_id, old_items, new_items):
+    """Append-only changes insert just the new rows; anything else rewrites the list."""
+    if new_items[:len(old_items)] == old_items:
+        start = len(old_items)
+    else:
+        await db.execute(
+            "DELETE FROM ppe_items WHERE guild_id = ? AND player_key = ? AND ppe_id = ?",
+            (guild_id, key, ppe_id),
+        )
+        start = 0
+    rows = [(guild_id, key, ppe_id, pos, name) for pos, name in enumerate(new_items) if pos >= start]
+    if rows:
+        await db.executemany(
+            "INSERT INTO ppe_items (guild_id, player_key, ppe_id, position, item_name) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+async def _write_item_counts(db, guild_id, key, ppe_id, old_counts, new_counts):
+    """Upsert the items whose copy count changed; drop the ones no longer held."""
+    changed = [
+        (guild_id, key, ppe_id, item_key, copies)
+        for item_key, copies in new_counts.items() if old_counts.get(item_key) != copies
+    ]
+    if changed:
+        await db.executemany(
+            "INSERT INTO ppe_item_counts (guild_id, player_key, ppe_id, item_key, copies) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, player_key, ppe_id, item_key) DO UPDATE SET copies = excluded.copies",
+            changed,
+        )
+    removed = [(guild_id, key, ppe_id, item_key) for item_key in old_counts.keys() - new_counts.keys()]
+    if removed:
+        await db.executemany(
+            "DELETE FROM ppe_item_counts WHERE guild_id = ? AND player_key = ? AND ppe_id = ? AND item_key = ?",
+            removed,
+        )
+
+async def _write_player(db, guild_id, key, old, new):
+    if old is None or _player_row(guild_id, key, old) != _player_row(guild_id, key, new):
+        await db.execute(
+            "INSERT INTO players (guild_id, player_key, active_ppe, is_member) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (guild_id, player_key) DO UPDATE SET "
+            "active_ppe = excluded.active_ppe, is_member = excluded.is_member",
+            _player_row(guild_id, key, new),
+        )
+
+    old_ppes = {p["id"]: p for p in (old or {}).get("ppes", [])}
+    new_ppes = {p["id"]: p for p in new.get("ppes", [])}
+
+    for ppe_id in old_ppes.keys() - new_ppes.keys():
+        await _delete_ppe(db, guild_id, key, ppe_id)
+
+    for ppe_id, ppe in new_ppes.items():
+        old_ppe = old_ppes.get(ppe_id)
+        if old_ppe is None or _ppe_row(guild_id, key, old_ppe) != _ppe_row(guild_id, key, ppe):
+            await db.execute(
+                "INSERT INTO ppes (guild_id, player_key, ppe_id, name, points) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, player_key, ppe_id) DO UPDATE SET "
+                "name = excluded.name, points = excluded.points",
+                _ppe_row(guild_id, key, ppe),
+            )
+        old_items = (old_ppe or {}).get("items", [])
+        new_items = ppe.get("items", [])
+        if old_items != new_items:
+            await _write_items(db, guild_id, key, ppe_id, old_items, new_items)
+        # PPEs that never had an index built (e.g. imported from JSON) are rebuilt on load
+        new_counts = ppe.get("item_counts")
+        if new_counts is not None:
+            old_counts = (old_ppe or {}).get("item_counts") or {}
+            if old_counts != new_counts:
+                await _write_item_counts(db, guild_id, key, ppe_id, old_counts, new_counts)
+
+async def save_guild_records(guild_id: int, records: dict, players=None):
+    """
+    Persist a guild's records, touching only the rows that changed since
+    they were last loaded or saved. Runs as a single transaction.
+    `players` limits the diff (and the snapshot update) to those player
+    keys; by default every player is compared.
+    """
+    async with _write_lock:
+        await _save_guild_records(guild_id, records, players)
+
+async def _save_guild_records(guild_id, records, players):
+    db = await _conn()
+    old = _snapshots.get(guild_id)
+    if old is None:
+        await load_guild_records(guild_id)
+        old = _snapshots[guild_id]
+    keys = old.keys() | records.keys() if players is None else set(players)
+
+    try:
+        for key in keys:
+            data = records.get(key)
+            if data is None:
+                if key in old:
+                    await _delete_player(db, guild_id, key)
+            elif old.get(key) != data:
+                await _write_player(db, guild_id, key, old.get(key), data)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    for key in keys:
+        if key in records:
+            old[key] = copy.deepcopy(records[key])
+        else:
+            old.pop(key, None)
+
+
+# -------------------------------------------------------------------------
+# Screenshot hashes (repost detection)
+# -------------------------------------------------------------------------
+
+async def load_screenshot_hashes(guild_id: int, limit: int):
+    """Most recent scored screenshots for a guild, oldest first."""
+    db = await _conn()
+    async with db.execute(
+        "SELECT gui_hash, frame_hash, items, player_key, message_id, created_at FROM screenshot_hashes "
+        "WHERE guild_id = ? ORDER BY created_at DESC LIMIT ?",
+        (guild_id, limit),
+    ) as cur:
+        rows = await cur.fetchall()
+    return rows[::-1]
+
+async def add_screenshot_hashes(guild_id: int, rows, keep=None):
+    """
+    Insert (gui_hash, frame_hash, items, player_key, message_id, created_at)
+    rows. With `keep`, older rows beyond the guild's newest `keep` are
+    deleted so the table does not grow without bound.
+    """
+    async with _write_lock:
+        await _add_screenshot_hashes(guild_id, rows, keep)
+
+async def _add_screenshot_hashes(guild_id, rows, keep):
+    db = await _conn()
+    await db.executemany(
+        "INSERT INTO screenshot_hashes (guild_id, gui_hash, frame_hash, items, player_key, message_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(guild_id, *row) for row in rows],
+    )
+    if keep is not None:
+        await db.execute(
+            "DELETE FROM screenshot_hashes WHERE guild_id = ? AND rowid NOT IN ("
+            "SELECT rowid FROM screenshot_hashes WHERE guild_id = ? ORDER BY created_at DESC, rowid DESC LIMIT ?)",
+            (guild_id, guild_id, keep),
+        )
+    await db.commit()
+
+
+# -------------------------------------------------------------------------
+# One-shot migration from data/{guild_id}_loot_records.json
+# -------------------------------------------------------------------------
+
+async def migrate_json_records(data_dir="./data"):
+    """
+    Import every per-guild JSON record file that has not been imported yet.
+    Guilds that already have rows in the database are left untouched.
+    The JSON files are kept as a backup.
+    """
+    if not os.path.isdir(data_dir):
+        return 0
+    db = await _conn()
+    migrated = 0
+
+    for file in sorted(os.listdir(data_dir)):
+        if not file.endswith("_loot_records.json"):
+            continue
+        guild_part = file[:-len("_loot_records.json")]
+        if not guild_part.isdigit():
+            continue
+        guild_id = int(guild_part)
+        name = f"json:{file}"
+
+        async with db.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)) as cur:
+            if await cur.fetchone():
+                continue
+
+        try:
+            with open(os.path.join(data_dir, file), "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Skipping {file}: {e}")
+            continue
+
+        async with db.execute("SELECT 1 FROM players WHERE guild_id = ? LIMIT 1", (guild_id,)) as cur:
+            has_rows = await cur.fetchone() is not None
+
+        async with _write_lock:
+            if has_rows:
+                print(f"ℹ️ Guild {guild_id} already has records in the database; not importing {file}.")
+            else:
+                _snapshots[guild_id] = {}
+                await _save_guild_records(guild_id, records, None)
+                migrated += 1
+                print(f"📦 Migrated {len(records)} players from {file}")
+
+            await db.execute(
+                "INSERT INTO migrations (name, applied_at) VALUES (?, ?)",
+                (name, datetime.now(timezone.utc).isoformat()),
+            )
+            await db.commit()
+
+    return migrated
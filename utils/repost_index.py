@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timezone
+
+from utils.image_hash import hamming
+from utils.lru import LRUCache
+from utils.record_store import add_screenshot_hashes, load_screenshot_hashes
+
+# Scored screenshots remembered per guild (loaded from the database on first use)
+REPOST_HISTORY = 5000
+
+# A post is a repeat when it shows the same detected items, a near-identical
+# loot GUI and a near-identical whole frame as a screenshot already scored.
+# The GUI alone is not enough: two genuine drops of the same item render an
+# identical loot bag, so the frame (game view) has to match as well.
+GUI_MAX_DISTANCE = 24    # bits of the 256-bit GUI hash (rescaled re-posts land ~17)
+FRAME_MAX_DISTANCE = 6   # bits of the 64-bit frame hash
+
+_history = {}  # guild_id -> LRUCache((gui_hash, frame_hash) -> entry)
+_locks = {}    # guild_id -> asyncio.Lock
+
+
+def repost_lock(guild_id: int):
+    """
+    Hold this from find_repost() until remember_screenshots() so two batches
+    cross-posting the same screenshot cannot both pass the check.
+    """
+    if guild_id not in _locks:
+        _locks[guild_id] = asyncio.Lock()
+    return _locks[guild_id]
+
+
+def item_set(items):
+    """Order-independent key for a screenshot's detected items."""
+    return "|".join(sorted(det["key"] for det in items))
+
+def _entry(gui_hash, frame_hash, items, player_key, message_id, created_at):
+    return {
+        "gui": int(gui_hash, 16), "frame": int(frame_hash, 16), "items": items,
+        "player": player_key, "message_id": message_id, "created_at": created_at,
+    }
+
+async def _guild_history(guild_id: int) -> LRUCache:
+    history = _history.get(guild_id)
+    if history is None:
+        history = LRUCache(REPOST_HISTORY)
+        for row in await load_screenshot_hashes(guild_id, REPOST_HISTORY):
+            history.put(row[:2], _entry(*row))
+        _history[guild_id] = history
+    return history
+
+
+def _matches(entry, gui, frame, items):
+    return (entry["items"] == items
+            and hamming(entry["frame"], frame) <= FRAME_MAX_DISTANCE
+            and hamming(entry["gui"], gui) <= GUI_MAX_DISTANCE)
+
+async def find_repost(guild_id: int, result):
+    """Return the earlier scored screenshot a detect_loot result repeats, or None."""
+    history = await _guild_history(guild_id)
+    gui, frame, items = int(result["gui_hash"], 16), int(result["frame_hash"], 16), item_set(result["items"])
+    for _, entry in reversed(history.items()):
+        if _matches(entry, gui, frame, items):
+            return entry
+    return None
+
+def is_same_screenshot(a, b):
+    """Compare two detect_loot results by their hashes and items."""
+    return _matches(
+        _entry(a["gui_hash"], a["frame_hash"], item_set(a["items"]), None, None, None),
+        int(b["gui_hash"], 16), int(b["frame_hash"], 16), item_set(b["items"]),
+    )
+
+async def remember_screenshots(guild_id: int, screenshots):
+    """Record scored screenshots: [(detect_loot result, player_key, message_id)]."""
+    if not screenshots:
+        return
+    history = await _guild_history(guild_id)
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows = [
+        (result["gui_hash"], result["frame_hash"], item_set(result["items"]), player_key, message_id, created_at)
+        for result, player_key, message_id in screenshots
+    ]
+    # The table keeps what the in-memory history can hold; older rows are pruned
+    await add_screenshot_hashes(guild_id, rows, keep=REPOST_HISTORY)
+    for row in rows:
+        history.put(row[:2], _entry(*row))
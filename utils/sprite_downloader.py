@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import aiohttp
+
+from utils.atomic_io import write_json_atomic
+
+# --- Defaults (the download scripts can override any of them) ---
+SPRITE_MANIFEST = "./sprite_manifest.json"
+CONCURRENCY = 8            # simultaneous requests (also the connection pool size)
+REQUESTS_PER_SECOND = 10   # token bucket refill rate
+BURST = 10                 # token bucket size
+TIMEOUT = 15               # seconds per request
+RETRIES = 3                # extra attempts on 429 / 5xx / connection errors
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/121.0.0.0 Safari/537.36"
+)
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, up to `burst` at once."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def load_manifest(path=SPRITE_MANIFEST):
+    """{save path: {"url", "etag", "last_modified", "size"}} from earlier runs."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_file_atomic(path, data):
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def browser_cookies(url, profile_dir=None, wait=1.0):
+    """
+    Open `url` once in headless Chrome and return (cookies, user agent) so
+    the HTTP session looks like the browser visit (helps with Cloudflare).
+    Selenium is only needed when this is called.
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    if profile_dir:
+        # Persistent profile so cookies survive between runs
+        options.add_argument(f"--user-data-dir={profile_dir}")
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={USER_AGENT}")
+
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(url)
+        time.sleep(wait)
+        try:
+            user_agent = driver.execute_script("return navigator.userAgent;")
+        except Exception:
+            user_agent = USER_AGENT
+        return {c["name"]: c["value"] for c in driver.get_cookies()}, user_agent
+    finally:
+        driver.quit()
+
+
+class SpriteDownloader:
+    """
+    Fetch many small files over one pooled aiohttp session.
+
+    At most `concurrency` requests run at once and a token bucket keeps
+    the average rate polite. Files already on disk are revalidated with
+    If-None-Match / If-Modified-Since from the manifest, so a rerun only
+    transfers sprites that are missing or changed on the server.
+    """
+
+    def __init__(self, manifest_path=SPRITE_MANIFEST, concurrency=CONCURRENCY,
+                 rate=REQUESTS_PER_SECOND, burst=BURST, cookies=None, user_agent=USER_AGENT,
+                 referer=None, revalidate=True):
+        self.manifest_path = manifest_path
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.cookies = cookies or {}
+        self.headers = {"User-Agent": user_agent}
+        if referer:
+            self.headers["Referer"] = referer
+        # False: trust files already on disk and only fetch missing ones
+        self.revalidate = revalidate
+        self.manifest = load_manifest(manifest_path)
+        self.stats = {"downloaded": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+
+    def _conditional_headers(self, url, path):
+        entry = self.manifest.get(path)
+        if not entry or entry.get("url") != url or not os.path.exists(path):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def _fetch(self, session, semaphore, url, path, label):
+        if not self.revalidate and os.path.exists(path):
+            self.stats["skipped"] += 1
+            return
+        headers = self._conditional_headers(url, path)
+
+        async with semaphore:
+            for attempt in range(RETRIES + 1):
+                await self.bucket.acquire()
+                try:
+                    async with session.get(url, headers=headers) as resp:
+                        if resp.status == 304:
+                            self.stats["unchanged"] += 1
+                            return
+                        if resp.status == 200:
+                            data = await resp.read()
+                            await asyncio.to_thread(_write_file_atomic, path, data)
+                            self.manifest[path] = {
+                                "url": url,
+                                "etag": resp.headers.get("ETag"),
+                                "last_modified": resp.headers.get("Last-Modified"),
+                                "size": len(data),
+                            }
+                            self.stats["downloaded"] += 1
+                            print(f"✅ Downloaded {label}")
+                            return
+                        if resp.status != 429 and resp.status < 500:
+                            print(f"❌ Failed {label} (HTTP {resp.status}) | {url}")
+                            break
+                        retry_after = resp.headers.get("Retry-After", "")
+                        delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == RETRIES:
+                        print(f"⚠️ Error downloading {label}: {e}")
+                        break
+                    delay = 2 ** attempt
+                except OSError as e:
+                    # Saving failed (disk full, bad file name...); no point retrying
+                    print(f"❌ Could not save {label} to {path}: {e}")
+                    break
+                if attempt < RETRIES:
+                    await asyncio.sleep(delay)
+            else:
+                print(f"❌ Failed {label} after {RETRIES + 1} attempts | {url}")
+            self.stats["failed"] += 1
+
+    async def download(self, jobs):
+        """
+        Download [(url, save path, label)] and update the manifest.
+        Returns the counts of downloaded / unchanged / skipped / failed files.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=self.headers, cookies=self.cookies) as session:
+            try:
+                await asyncio.gather(*(self._fetch(session, semaphore, *job) for job in jobs))
+            finally:
+                # Keep what finished even if the run was interrupted
+                write_json_atomic(self.manifest_path, self.manifest)
+        return dict(self.stats)
+
+
+def download_sprites(jobs, **options):
+    """Blocking helper for the download scripts: SpriteDownloader(**options).download(jobs)."""
+    return asyncio.run(SpriteDownloader(**options).download(jobs))
@@ -0,0 +1,423 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.atomic_io import write_json_atomic
+from utils.points_table import LOOT_POINTS_CSV, normalize_item_name
+from utils.template_catalog import SPRITE_FOLDERS, catalog_signature, load_catalog
+
+# Base and shiny sprite folders, combined through the template catalog
+TEMPLATES_FOLDER = SPRITE_FOLDERS
+
+# Geometry shared with find_items: sprites are matched at 40x40, top 2/3 only
+TEMPLATE_SIZE = 40
+CROP_H = int(TEMPLATE_SIZE * (2/3))  # ≈ 26–27 pixels
+MASK_THRESHOLD = 10  # alpha above this counts as sprite pixels for the hue score
+
+# Coarse pruning index (see utils.matcher.coarse_scores)
+THUMBNAIL_SIZE = 8   # templates are summarized as 8x8 blurred thumbnails
+HUE_BINS = 18        # 10° (OpenCV units) per hue histogram bin
+
+# Precompiled, memory-mapped bank (see build_template_cache)
+TEMPLATE_CACHE_DIR = "./template_cache/"
+CACHE_VERSION = 1
+
+# The full catalog signature stats every sprite (~5 ms for ~1900 files), too
+# much for every detection. In between, adding/removing/replacing a sprite
+# shows up in its folder's mtime and a points edit in the CSV's; sprites
+# overwritten in place are caught by a full recheck every this many seconds.
+SIGNATURE_RECHECK_SECONDS = float(os.getenv("TEMPLATE_RECHECK_SECONDS", "60"))
+
+# Every per-template array of a TemplateBank; row i belongs to names[i]
+BANK_ARRAYS = (
+    "blurred", "alpha", "mask", "hue",
+    "match_mask", "match_count", "centered", "centered_norm",
+    "hue_flat", "hue_mask", "hue_count",
+    "thumbnail", "thumbnail_mask", "thumbnail_count", "hue_hist", "mean_hue",
+)
+
+
+class TemplateBank:
+    """
+    Sprite templates preprocessed once and stacked into contiguous arrays.
+
+    Row i of every array belongs to names[i] (the canonical CSV item
+    name), keys[i] (its points-table key) and shiny[i]:
+    - blurred: (N, CROP_H, 40, 3) uint8, top 2/3 of the sprite, Gaussian blurred
+    - alpha:   (N, CROP_H, 40)    uint8, alpha channel used as matchTemplate mask
+    - mask:    (N, CROP_H, 40)    bool,  alpha > MASK_THRESHOLD
+    - hue:     (N, CROP_H, 40)    uint8, HSV hue of the unblurred top 2/3
+
+    The flattened float32 tensors used by utils.matcher, and the coarse
+    pruning index (8x8 thumbnails, hue histograms, mean hue), are derived
+    once here too.
+    """
+
+    def __init__(self, names, blurred, alpha, mask, hue, signature, keys=None, shiny=None):
+        self.names = names
+        self.keys = keys if keys is not None else [normalize_item_name(n) for n in names]
+        self.shiny = shiny if shiny is not None else np.zeros(len(names), bool)
+        self.index = {name: i for i, name in enumerate(names)}
+        self.blurred = blurred
+        self.alpha = alpha
+        self.mask = mask
+        self.hue = hue
+        self.signature = signature
+        self._build_match_tensors()
+        self._build_prune_index()
+
+    def _build_match_tensors(self):
+        n = len(self.names)
+        pixels = CROP_H * TEMPLATE_SIZE
+
+        # matchTemplate treats a uint8 mask as binary: any nonzero alpha counts
+        match_mask = (self.alpha > 0).reshape(n, pixels).astype(np.float32)
+        match_count = match_mask.sum(axis=1)
+
+        # Masked, per-channel zero-mean templates and their L2 norms
+        tpl = self.blurred.reshape(n, pixels, 3).astype(np.float32)
+        tpl_mean = (tpl * match_mask[..., None]).sum(axis=1) / np.maximum(match_count, 1)[:, None]
+        centered = (tpl - tpl_mean[:, None, :]) * match_mask[..., None]
+
+        self.match_mask = np.ascontiguousarray(match_mask)
+        self.match_count = match_count
+        self.centered = np.ascontiguousarray(centered.reshape(n, pixels * 3))
+        self.centered_norm = np.sqrt((self.centered.astype(np.float64) ** 2).sum(axis=1))
+
+        # Hue score inputs: flattened hue and the alpha > MASK_THRESHOLD mask
+        self.hue_flat = np.ascontiguousarray(self.hue.reshape(n, pixels).astype(np.float32))
+        self.hue_mask = np.ascontiguousarray(self.mask.reshape(n, pixels).astype(np.float32))
+        self.hue_count = self.hue_mask.sum(axis=1)
+
+    def _build_prune_index(self):
+        n = len(self.names)
+        size = (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        cells = THUMBNAIL_SIZE * THUMBNAIL_SIZE
+
+        thumbs = np.empty((n, cells, 3), np.float32)
+        thumb_mask = np.empty((n, cells), np.float32)
+        hue_hist = np.zeros((n, HUE_BINS), np.float32)
+        mean_hue = np.zeros(n, np.float32)
+
+        for i in range(n):
+            thumbs[i] = cv2.resize(self.blurred[i].astype(np.float32), size,
+                                   interpolation=cv2.INTER_AREA).reshape(cells, 3)
+            coverage = cv2.resize((self.alpha[i] > 0).astype(np.float32), size,
+                                  interpolation=cv2.INTER_AREA)
+            thumb_mask[i] = (coverage > 0.5).reshape(cells)
+
+            hues = self.hue[i][self.mask[i]]
+            if len(hues):
+                hue_hist[i] = hue_histogram(hues)
+                mean_hue[i] = circular_mean_hue(hues)
+
+        # Same masked zero-mean / unit-norm form as the full matcher, in miniature
+        count = np.maximum(thumb_mask.sum(axis=1), 1)
+        mean = (thumbs * thumb_mask[..., None]).sum(axis=1) / count[:, None]
+        centered = ((thumbs - mean[:, None, :]) * thumb_mask[..., None]).reshape(n, cells * 3)
+        norm = np.linalg.norm(centered, axis=1)
+
+        self.thumbnail = np.ascontiguousarray(centered / np.maximum(norm, 1e-6)[:, None])
+        self.thumbnail_mask = np.ascontiguousarray(thumb_mask)
+        self.thumbnail_count = count
+        self.hue_hist = hue_hist
+        self.mean_hue = mean_hue
+
+    @classmethod
+    def from_arrays(cls, names, keys, shiny, signature, arrays):
+        """Wrap already-derived arrays (e.g. memory-mapped from the cache) without recomputing."""
+        bank = cls.__new__(cls)
+        bank.names = names
+        bank.keys = keys
+        bank.shiny = shiny
+        bank.index = {name: i for i, name in enumerate(names)}
+        bank.signature = signature
+        for name in BANK_ARRAYS:
+            setattr(bank, name, arrays[name])
+        return bank
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in BANK_ARRAYS}
+
+    def __len__(self):
+        return len(self.names)
+
+
+def hue_histogram(hues):
+    """Normalized HUE_BINS histogram of OpenCV hue values (0–180)."""
+    bins = np.minimum(hues.astype(np.int32) * HUE_BINS // 180, HUE_BINS - 1)
+    return np.bincount(bins, minlength=HUE_BINS).astype(np.float32) / len(hues)
+
+
+def circular_mean_hue(hues):
+    """Mean of OpenCV hue values, respecting the 180 → 0 wraparound."""
+    angles = hues.astype(np.float32) * (2 * np.pi / 180)
+    mean = np.arctan2(np.sin(angles).mean(), np.cos(angles).mean())
+    return (mean % (2 * np.pi)) * 180 / (2 * np.pi)
+
+
+def preprocess_template(tpl):
+    """Resize, crop and blur one sprite image. Returns (blurred, alpha, mask, hue)."""
+    # Handle grayscale / missing alpha
+    if tpl.ndim == 2:
+        tpl = cv2.cvtColor(tpl, cv2.COLOR_GRAY2BGR)
+    if tpl.shape[2] == 4:
+        bgr = tpl[..., :3]
+        alpha = tpl[..., 3]
+    else:
+        bgr = tpl
+        alpha = np.ones(bgr.shape[:2], dtype=np.uint8) * 255
+
+    if bgr.shape[:2] != (TEMPLATE_SIZE, TEMPLATE_SIZE):
+        bgr = cv2.resize(bgr, (TEMPLATE_SIZE, TEMPLATE_SIZE), interpolation=cv2.INTER_AREA)
+    if alpha.shape[:2] != (TEMPLATE_SIZE, TEMPLATE_SIZE):
+        alpha = cv2.resize(alpha, (TEMPLATE_SIZE, TEMPLATE_SIZE), interpolation=cv2.INTER_NEAREST)
+
+    bgr_top = np.ascontiguousarray(bgr[:CROP_H])
+    alpha_top = np.ascontiguousarray(alpha[:CROP_H])
+
+    blurred = cv2.GaussianBlur(bgr_top, (3, 3), 0.6)
+    hue = cv2.cvtColor(bgr_top, cv2.COLOR_BGR2HSV)[..., 0]
+    return blurred, alpha_top, alpha_top > MASK_THRESHOLD, hue
+
+
+def _folders(templates_folder):
+    return (templates_folder,) if isinstance(templates_folder, str) else tuple(templates_folder)
+
+
+def _empty_bank(signature):
+    empty = (0, CROP_H, TEMPLATE_SIZE)
+    return TemplateBank([], np.empty(empty + (3,), np.uint8), np.empty(empty, np.uint8),
+                        np.empty(empty, bool), np.empty(empty, np.uint8), signature)
+
+
+def load_template_bank(templates_folder=TEMPLATES_FOLDER):
+    """Build a TemplateBank from every sprite in the catalog for these folders."""
+    signature, catalog = load_catalog(_folders(templates_folder))
+
+    names, keys, shiny, blurred, alphas, masks, hues = [], [], [], [], [], [], []
+    for entry in catalog:
+        tpl = cv2.imread(entry["path"], cv2.IMREAD_UNCHANGED)
+        if tpl is None:
+            continue
+
+        b, a, m, h = preprocess_template(tpl)
+        names.append(entry["name"])
+        keys.append(entry["key"])
+        shiny.append(entry["shiny"])
+        blurred.append(b)
+        alphas.append(a)
+        masks.append(m)
+        hues.append(h)
+
+    if not names:
+        return _empty_bank(signature)
+
+    return TemplateBank(
+        names,
+        np.ascontiguousarray(np.stack(blurred)),
+        np.ascontiguousarray(np.stack(alphas)),
+        np.ascontiguousarray(np.stack(masks)),
+        np.ascontiguousarray(np.stack(hues)),
+        signature,
+        keys=keys,
+        shiny=np.array(shiny, bool),
+    )
+
+
+# -------------------------------------------------------------------------
+# Binary cache: one .npy per array, memory-mapped by every process
+# -------------------------------------------------------------------------
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _open_arrays(cache_dir, manifest):
+    """Memory-map the manifest's arrays (read-only); None if any is missing or short."""
+    folder = os.path.join(cache_dir, manifest["dir"])
+    n = len(manifest["entries"])
+    arrays = {}
+    try:
+        for name in BANK_ARRAYS:
+            arr = np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r" if n else None)
+            if len(arr) != n:
+                return None
+            arrays[name] = arr
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def _bank_from_manifest(manifest, arrays):
+    entries = manifest["entries"]
+    return TemplateBank.from_arrays(
+        [e["name"] for e in entries],
+        [e["key"] for e in entries],
+        np.array([e["shiny"] for e in entries], bool),
+        manifest["signature"],
+        arrays,
+    )
+
+
+def load_cached_bank(signature, cache_dir=TEMPLATE_CACHE_DIR):
+    """The memory-mapped bank if the cache matches this catalog signature, else None."""
+    manifest = _read_manifest(cache_dir)
+    if manifest is None or manifest["signature"] != signature:
+        return None
+    arrays = _open_arrays(cache_dir, manifest)
+    if arrays is None:
+        return None
+    return _bank_from_manifest(manifest, arrays)
+
+
+def build_template_cache(templates_folder=TEMPLATES_FOLDER, cache_dir=TEMPLATE_CACHE_DIR):
+    """
+    Write the preprocessed bank for the current catalog to cache_dir.
+
+    Rows are reused from the previous cache for every sprite whose file
+    digest is unchanged, so only new or edited PNGs are decoded again.
+    Returns (reused, rebuilt).
+    """
+    signature, catalog = load_catalog(_folders(templates_folder))
+
+    old_manifest = _read_manifest(cache_dir)
+    old_arrays = _open_arrays(cache_dir, old_manifest) if old_manifest else None
+    old_rows = {}
+    if old_arrays is not None:
+        old_rows = {e["digest"]: i for i, e in enumerate(old_manifest["entries"])}
+
+    # --- Decide, per sprite, whether its rows can be copied over ---
+    entries, sources, fresh = [], [], []
+    for entry in catalog:
+        try:
+            digest = file_digest(entry["path"])
+        except OSError:
+            continue
+        if digest in old_rows:
+            sources.append(("old", old_rows[digest]))
+        else:
+            tpl = cv2.imread(entry["path"], cv2.IMREAD_UNCHANGED)
+            if tpl is None:
+                continue
+            sources.append(("new", len(fresh)))
+            fresh.append(preprocess_template(tpl))
+        entries.append({"name": entry["name"], "key": entry["key"],
+                        "shiny": bool(entry["shiny"]), "digest": digest})
+
+    # --- Derive tensors for the changed sprites only ---
+    new_arrays = None
+    if fresh:
+        blurred, alphas, masks, hues = (np.ascontiguousarray(np.stack(col)) for col in zip(*fresh))
+        new_arrays = TemplateBank([""] * len(fresh), blurred, alphas, masks, hues, signature).arrays()
+    empty = _empty_bank(signature).arrays() if not entries else None
+
+    arrays = {}
+    for name in BANK_ARRAYS:
+        sample = (new_arrays or old_arrays or empty)[name]
+        out = np.empty((len(entries),) + sample.shape[1:], sample.dtype)
+        for row, (origin, i) in enumerate(sources):
+            out[row] = (old_arrays if origin == "old" else new_arrays)[name][i]
+        arrays[name] = out
+
+    # --- Write to a private folder, then publish it via the manifest ---
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".build-")
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    bank_dir = f"bank-{signature}"
+    try:
+        os.replace(tmp_dir, os.path.join(cache_dir, bank_dir))
+    except OSError:
+        # Another process published the same signature first; use theirs
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    write_json_atomic(os.path.join(cache_dir, "manifest.json"), {
+        "version": CACHE_VERSION,
+        "signature": signature,
+        "dir": bank_dir,
+        "entries": entries,
+    }, indent=None)
+
+    # Older bank folders are no longer referenced (open mappings stay valid)
+    for name in os.listdir(cache_dir):
+        if name.startswith("bank-") and name != bank_dir:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+    rebuilt = len(fresh)
+    return len(entries) - rebuilt, rebuilt
+
+
+# -------------------------------------------------------------------------
+# Process-wide cache
+# -------------------------------------------------------------------------
+
+_banks = {}
+_banks_lock = threading.Lock()
+_signatures = {}   # folders key -> (stamp, checked at, catalog signature)
+
+def _stamp(folders):
+    """Cheap change marker: mtime and size of each folder and the points CSV."""
+    stamp = []
+    for path in (*folders, LOOT_POINTS_CSV):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def _current_signature(key, folders):
+    """catalog_signature(folders), recomputed only when the stamp changes or goes stale."""
+    stamp = _stamp(folders)
+    now = time.monotonic()
+    cached = _signatures.get(key)
+    if cached is not None and cached[0] == stamp and now - cached[1] < SIGNATURE_RECHECK_SECONDS:
+        return cached[2]
+    signature = catalog_signature(folders)
+    _signatures[key] = (stamp, now, signature)
+    return signature
+
+def get_template_bank(templates_folder=TEMPLATES_FOLDER, cache_dir=TEMPLATE_CACHE_DIR):
+    """
+    Return the cached TemplateBank for these folders, (re)loading it only
+    when a sprite or the points CSV has changed since the last load.
+    Arrays are memory-mapped from the binary cache, so every worker
+    process shares one copy through the page cache.
+    """
+    folders = _folders(templates_folder)
+    key = tuple(os.path.abspath(f) for f in folders)
+
+    with _banks_lock:
+        signature = _current_signature(key, folders)
+        bank = _banks.get(key)
+        if bank is None or bank.signature != signature:
+            bank = load_cached_bank(signature, cache_dir)
+            if bank is None:
+                reused, rebuilt = build_template_cache(folders, cache_dir)
+                print(f"📦 Rebuilt template cache ({rebuilt} decoded, {reused} reused)")
+                bank = load_cached_bank(signature, cache_dir)
+            if bank is None:
+                # Cache not writable or changed underneath us; build in memory
+                bank = load_template_bank(folders)
+            _banks[key] = bank
+            print(f"🗂️ Loaded {len(bank)} sprite templates ({int(bank.shiny.sum())} shiny) from {', '.join(folders)}")
+        return bank
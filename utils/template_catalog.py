@@ -0,0 +1,122 @@
+import csv
+import hashlib
+import json
+import os
+
+from utils.atomic_io import write_json_atomic
+from utils.points_table import LOOT_POINTS_CSV, normalize_item_name
+
+BASE_SPRITES_FOLDER = "./sprites/"
+SHINY_SPRITES_FOLDER = "./shiny_sprites/"
+SPRITE_FOLDERS = (BASE_SPRITES_FOLDER, SHINY_SPRITES_FOLDER)
+CATALOG_CACHE = "./template_catalog.json"
+
+SHINY_SUFFIX = " (shiny)"
+
+
+def catalog_signature(folders=SPRITE_FOLDERS, csv_path=LOOT_POINTS_CSV):
+    """
+    Stable fingerprint of the sprite folders (file names, sizes, mtimes)
+    and the points CSV. Unlike hash(), it is the same in every process and
+    across restarts, so it can be stored in cache files.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for folder in folders:
+        entries = []
+        if os.path.isdir(folder):
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(".png"):
+                        st = entry.stat()
+                        entries.append(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}")
+        h.update(os.path.abspath(folder).encode())
+        h.update("\n".join(sorted(entries)).encode())
+    try:
+        st = os.stat(csv_path)
+        h.update(f"{csv_path}\0{st.st_size}\0{st.st_mtime_ns}".encode())
+    except FileNotFoundError:
+        pass
+    return h.hexdigest()
+
+
+def _csv_names(csv_path):
+    """{normalized item name: item name as written in the CSV}"""
+    names = {}
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                names[normalize_item_name(row["Item Name"])] = row["Item Name"].strip()
+    except (OSError, KeyError, csv.Error) as e:
+        print(f"⚠️ Could not read item names from {csv_path} ({e}); using sprite file names.")
+    return names
+
+
+def canonical_name(stem, csv_names):
+    """
+    Map a sprite file name (without .png) to the CSV's spelling of the item.
+    The download scripts strip or replace characters Windows does not allow
+    in file names, so a few spellings are tried before falling back to the
+    stem itself.
+    """
+    for candidate in (stem, stem.replace("_", ":"), stem.replace("_", " "), stem.replace("_", "/")):
+        name = csv_names.get(normalize_item_name(candidate))
+        if name:
+            return name
+    return " ".join(stem.replace("_", " ").split())
+
+
+def build_catalog(folders=SPRITE_FOLDERS, csv_path=LOOT_POINTS_CSV):
+    """
+    List every sprite as {"path", "name", "key", "shiny"}, where name is the
+    canonical CSV item name and key its normalized lookup key. An item found
+    in more than one folder is listed once (first folder wins).
+    """
+    csv_names = _csv_names(csv_path)
+    entries, seen = [], set()
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        for file in sorted(os.listdir(folder)):
+            if not file.lower().endswith(".png"):
+                continue
+            stem = file[:-4]
+            shiny = stem.lower().endswith(SHINY_SUFFIX)
+            name = canonical_name(stem, csv_names)
+            if normalize_item_name(name) in seen:
+                continue
+            seen.add(normalize_item_name(name))
+            entries.append({
+                "path": os.path.join(folder, file),
+                "name": name,
+                "key": normalize_item_name(name),
+                "shiny": shiny,
+            })
+    return entries
+
+
+def load_catalog(folders=SPRITE_FOLDERS, csv_path=LOOT_POINTS_CSV, cache_path=CATALOG_CACHE):
+    """
+    Return (signature, entries), reading the cache file when it is still
+    current and rebuilding (and rewriting) it otherwise.
+    """
+    signature = catalog_signature(folders, csv_path)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return signature, [
+                {"path": path, "name": name, "key": normalize_item_name(name), "shiny": bool(shiny)}
+                for path, name, shiny in cached["entries"]
+            ]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    entries = build_catalog(folders, csv_path)
+    try:
+        write_json_atomic(cache_path, {
+            "signature": signature,
+            "entries": [[e["path"], e["name"], int(e["shiny"])] for e in entries],
+        }, indent=None)
+    except OSError as e:
+        print(f"⚠️ Could not write {cache_path}: {e}")
+    return signature, entries